@@ -0,0 +1,276 @@
+"""
+End-to-end crawl of a local fake registry: discovery of ids over the member list, then /info of every id.
+
+    python -m benchmarks.bench_crawl --registry nopriz --count 20000 --latency 0.05 --error-rate 0.005
+    python -m benchmarks.bench_crawl --registry nostroy --count 20000 --json >> bench.jsonl
+    python -m benchmarks.bench_crawl --registry nostroy --count 50000 --latency 0 --processes 4
+    # twice on a fixed port (cache keys are urls): the second run is served by the cache of the first one, or revalidated with --cache-ttl 0 --etag
+    python -m benchmarks.bench_crawl --count 20000 --port 8765 --http-cache /tmp/http_cache.sqlite3
+    # through 2 local proxies whose exit IPs get banned every 2000 requests and are rotated by the pool
+    python -m benchmarks.bench_crawl --count 20000 --proxies 2 --proxy-ban-after 2000 --rotation-cooldown 1
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import socket
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from aiohttp import TraceConfig
+
+from benchmarks.fake_registry import FakeRegistryConfig, FakeProxyConfig, serve, serve_proxy
+from benchmarks.fixtures import REGISTRY_START
+from src.http_cache import HttpCache
+from src.metrics import REGISTRY
+from src.parallel import crawl_parallel
+from src.pipeline import Pipeline
+from src.proxy import ProxyPool, Proxy
+from src.scrappers.nopriz import ScraperNopriz
+from src.scrappers.nostroy import ScraperNostroy
+from src.storage import MemberStore
+from src.transport import TransportConfig, create_session
+
+SCRAPPERS = {
+    'nopriz': ScraperNopriz,
+    'nostroy': ScraperNostroy,
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_server(config: FakeRegistryConfig, port: int, ready: multiprocessing.Event) -> None:
+    async def run():
+        await serve(config, port=port)
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def latency_tracer(latencies: list[float]) -> TraceConfig:
+    # client side latency of every request, including the failed ones
+    async def on_request_start(session, ctx, params):
+        ctx.started_at = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        latencies.append(time.perf_counter() - ctx.started_at)
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    return trace_config
+
+
+async def crawl(args: argparse.Namespace, base_url: str) -> dict:
+    latencies = []
+    transport = TransportConfig(timeout_total=args.timeout, timeout_sock_read=args.timeout)
+    http_cache = HttpCache(args.http_cache, ttl=args.cache_ttl) if args.http_cache else None
+    store = MemberStore(Path(tempfile.mkdtemp()) / 'members.sqlite3') if args.store or args.processes > 1 else None
+    # never a real change IP url: a direct connection or local stand-ins of the proxies
+    proxy_pool = ProxyPool([Proxy()])
+    proxy_runners, fake_proxies = [], []
+    if args.proxies:
+        proxies = []
+        for i in range(args.proxies):
+            port = free_port()
+            runner, fake_proxy = await serve_proxy(FakeProxyConfig(
+                ban_after=args.proxy_ban_after, ban_rate=args.proxy_ban_rate,
+                change_ip_latency=args.change_ip_latency, seed=i,
+            ), port=port)
+            proxy_runners.append(runner)
+            fake_proxies.append(fake_proxy)
+            proxies.append(Proxy(f'http://127.0.0.1:{port}', change_ip_url=f'http://127.0.0.1:{port}/change_ip'))
+        proxy_pool = ProxyPool(proxies)
+        proxy_pool.rotation_cooldown = args.rotation_cooldown
+
+    async with create_session(transport, trace_configs=[latency_tracer(latencies)]) as session:
+        scrapper = SCRAPPERS[args.registry](
+            date_from=REGISTRY_START,
+            date_to=datetime.now(),
+            max_concurrency=args.max_concurrency,
+            discovery_concurrency=args.discovery_concurrency,
+            store=store,
+            session=session,
+            proxy_pool=proxy_pool,
+            base_url=base_url,
+            http_cache=http_cache,
+        )
+        scrapper.ids_page_size = args.page_size
+
+        if args.pipeline:
+            # discovery, fetch, parse and store run as concurrent stages, reported as fetch
+            started_at = time.perf_counter()
+            rows = await Pipeline(scrapper, store_batch_size=args.batch_size).run(scrapper.iter_ids(filters={}))
+            fetch_time = time.perf_counter() - started_at
+            ids = range(rows)
+            discovery_time = 0.
+            pages = 0
+            discovery_latencies = []
+        elif args.stream:
+            # discovery and fetching overlap, the whole crawl is reported as fetch
+            started_at = time.perf_counter()
+            rows = 0
+            async for batch in scrapper.collect_data(scrapper.iter_ids(filters={}), batch_size=args.batch_size):
+                rows += len(batch)
+            fetch_time = time.perf_counter() - started_at
+            ids = range(rows)
+            discovery_time = 0.
+            pages = 0
+            discovery_latencies = []
+        else:
+            started_at = time.perf_counter()
+            ids = await scrapper.collect_ids(filters={})
+            discovery_time = time.perf_counter() - started_at
+            pages = len(latencies)
+            discovery_latencies, latencies[:] = latencies[:], []
+
+            started_at = time.perf_counter()
+            rows = 0
+            if args.processes > 1:
+                rows = await crawl_parallel(
+                    type(scrapper), ids, args.processes, db_filepath=store.filepath,
+                    date_from=scrapper.date_from, date_to=scrapper.date_to, max_concurrency=args.max_concurrency,
+                    proxies=[{'url': p.url, 'change_ip_url': p.change_ip_url} for p in scrapper.proxy_pool.proxies],
+                    base_url=base_url, transport=transport,
+                )
+            else:
+                async for batch in scrapper.collect_data(ids, batch_size=args.batch_size):
+                    rows += len(batch)
+            fetch_time = time.perf_counter() - started_at
+
+    if store is not None:
+        store.close()
+    if http_cache is not None:
+        http_cache.close()
+    for runner in proxy_runners:
+        await runner.cleanup()
+    return {
+        'registry': args.registry,
+        'count': args.count,
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'throttle_rate': args.throttle_rate,
+        'max_concurrency': args.max_concurrency,
+        'stream': args.stream,
+        'pipeline': args.pipeline,
+        'processes': args.processes,
+        'ids': len(ids),
+        'rows': rows,
+        'discovery_time': discovery_time,
+        'pages_per_sec': pages / discovery_time if discovery_time else 0.,
+        'discovery_ids_per_sec': len(ids) / discovery_time if discovery_time else 0.,
+        'fetch_time': fetch_time,
+        'ids_per_sec': rows / fetch_time if fetch_time else 0.,
+        'list_p50': percentile(discovery_latencies, 0.5),
+        'list_p99': percentile(discovery_latencies, 0.99),
+        'info_p50': percentile(latencies, 0.5),
+        'info_p99': percentile(latencies, 0.99),
+        'requests': pages + len(latencies),
+        'retries': scrapper.retries,
+        'http_cache': http_cache.format_stats() if http_cache is not None else None,
+        'proxies': [
+            {'proxy': proxy.label, 'rotations': proxy.rotations, **fake_proxy.requests}
+            for proxy, fake_proxy in zip(proxy_pool.proxies, fake_proxies)
+        ],
+        'final_limit': int(scrapper.limiter.limit),
+        'response_mb': sum(REGISTRY.metrics['registry_response_bytes_total'].values.values()) / 2 ** 20,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--registry', choices=list(SCRAPPERS), default='nostroy')
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.)
+    parser.add_argument('--throttle-rate', type=float, default=0.)
+    parser.add_argument('--ban-rate', type=float, default=0.)
+    parser.add_argument('--hang-rate', type=float, default=0.)
+    parser.add_argument('--timeout', type=float, default=5., help='client total and read timeout')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--max-concurrency', type=int, default=50)
+    parser.add_argument('--discovery-concurrency', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--store', action='store_true', help='upsert rows into a temporary sqlite store')
+    parser.add_argument('--stream', action='store_true', help='fetch ids while they are discovered')
+    parser.add_argument('--pipeline', action='store_true', help='run the crawl as a src.pipeline.Pipeline')
+    parser.add_argument('--port', type=int, default=0, help='port of the fake registry, 0 - any free one')
+    parser.add_argument('--http-cache', type=Path, help='sqlite file of src.http_cache, kept between runs')
+    parser.add_argument('--cache-ttl', type=float, default=24 * 60 * 60)
+    parser.add_argument('--etag', action='store_true', help='the fake registry sends ETag and answers 304')
+    parser.add_argument('--proxies', type=int, default=0,
+                        help='crawl through local stand-ins of rotating proxies, served by the crawl process')
+    parser.add_argument('--proxy-ban-after', type=int, default=0, help='requests of an exit IP before its ban')
+    parser.add_argument('--proxy-ban-rate', type=float, default=0., help='chance of a request to get the IP banned')
+    parser.add_argument('--change-ip-latency', type=float, default=0.5)
+    parser.add_argument('--rotation-cooldown', type=float, default=ProxyPool.rotation_cooldown)
+    parser.add_argument('--processes', type=int, default=1,
+                        help='fetch in several processes with src.parallel, rows go to a temporary sqlite store')
+    parser.add_argument('--json', action='store_true', help='print one JSON line instead of the report')
+    parser.add_argument('--metrics', action='store_true', help='add the summary of src.metrics to the report')
+    args = parser.parse_args()
+
+    config = FakeRegistryConfig(
+        registry=args.registry,
+        count=args.count,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        ban_rate=args.ban_rate,
+        hang_rate=args.hang_rate,
+        hang_time=args.timeout * 2,
+        etag=args.etag,
+    )
+    # the server runs in its own process, so peak RSS and CPU are the scraper's only
+    port = args.port or free_port()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(config, port, ready), daemon=True)
+    server.start()
+    try:
+        if not ready.wait(timeout=30):
+            raise RuntimeError('fake registry did not start')
+        result = asyncio.run(crawl(args, f'http://127.0.0.1:{port}'))
+    finally:
+        server.terminate()
+        server.join()
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{result['registry']}: {result['ids']} ids, {result['rows']} rows, {result['requests']} requests, "
+          f"{result['retries']} retries")
+    print(f"discovery: {result['discovery_time']:.2f}s, {result['pages_per_sec']:.1f} pages/s, "
+          f"{result['discovery_ids_per_sec']:,.0f} ids/s, p50 {result['list_p50'] * 1000:.0f}ms, "
+          f"p99 {result['list_p99'] * 1000:.0f}ms")
+    print(f"fetch:     {result['fetch_time']:.2f}s, {result['ids_per_sec']:,.0f} ids/s, "
+          f"p50 {result['info_p50'] * 1000:.0f}ms, p99 {result['info_p99'] * 1000:.0f}ms, "
+          f"concurrency limit {result['final_limit']}")
+    print(f"received:  {result['response_mb']:.1f} MB")
+    if result['http_cache']:
+        print(f"cache:     {result['http_cache']}")
+    for proxy in result['proxies']:
+        print(f"proxy:     {proxy['proxy']}: {proxy['forwarded']} forwarded, {proxy['banned']} banned, "
+              f"{proxy['change_ip']} IP changes requested, {proxy['rotations']} done")
+    print(f"peak RSS:  {result['peak_rss_mb']:.0f} MB")
+    if args.metrics:
+        print(REGISTRY.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Timestamps/sec of the registration date parsing of the discovery and the date formatting of
+parse_page_info against the previous strptime paths.
+
+    python -m benchmarks.bench_dates --count 1000000
+"""
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fixtures import REGISTRY_START
+from src.date_utils import ISO_FORMAT, as_msk, format_iso, parse_datetime, parse_iso
+from src.scrappers.nostroy import REGISTRATION_DATE_FORMAT
+
+
+def legacy_nopriz(value: str) -> datetime:
+    return datetime.strptime(re.sub(r'\+0\d:00', '', value), '%Y-%m-%dT%H:%M:%S')
+
+
+def legacy_nostroy(value: str) -> datetime:
+    return datetime.strptime(value, REGISTRATION_DATE_FORMAT)
+
+
+def legacy_format(value: str) -> str:
+    return datetime.strptime(value, ISO_FORMAT).strftime('%d.%m.%Y %X')
+
+
+def run(name: str, func, values: list[str]) -> list:
+    start = time.perf_counter()
+    result = [func(v) for v in values]
+    elapsed = time.perf_counter() - start
+    print(f'{name:<36} {len(values) / elapsed:>12,.0f} timestamps/s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    moments = [REGISTRY_START + timedelta(seconds=rnd.randrange(15 * 365 * 24 * 3600)) for _ in range(args.count)]
+    iso_values = [dt.strftime('%Y-%m-%dT%H:%M:%S+03:00') for dt in moments]
+    registry_values = [dt.strftime(REGISTRATION_DATE_FORMAT) for dt in moments]
+    # Moscow was UTC+4 in 2011-2014 and had DST before, the +03:00 of the registries holds since 2014
+    date_from = as_msk(datetime(2016, 1, 1))
+
+    print(f'{args.count} timestamps')
+    old = run('nopriz re.sub + strptime', legacy_nopriz, iso_values)
+    new = run('nopriz parse_iso', parse_iso, iso_values)
+    # the discovery compares every registration date against the window
+    assert [dt < date_from.replace(tzinfo=None) for dt in old] == [dt < date_from for dt in new]
+
+    old = run('nostroy strptime', legacy_nostroy, registry_values)
+    new = run('nostroy parse_datetime', lambda v: parse_datetime(v, REGISTRATION_DATE_FORMAT), registry_values)
+    assert [dt.replace(tzinfo=None) for dt in new] == old
+
+    # unique values, so the lru_cache of format_iso doesn't help
+    old = run('parse_page_info strptime + strftime', legacy_format, iso_values)
+    format_iso.cache_clear()
+    new = run('parse_page_info format_iso', lambda v: format_iso(v, '%d.%m.%Y %X'), iso_values)
+    assert new == old
+
+
+if __name__ == '__main__':
+    main()
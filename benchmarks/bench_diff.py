@@ -0,0 +1,57 @@
+"""
+CPU time of diffing two snapshots of the same registry with src.diff.
+
+    python -m benchmarks.bench_diff --count 200000 --changed 0.01
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.fixtures import make_nostroy_member
+from src.diff import diff_rows, diff_values, iter_parquet_values, row_values
+from src.exporters import ParquetExporter
+from src.scrappers.nostroy import ScraperNostroy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200_000)
+    parser.add_argument('--changed', type=float, default=0.01, help='fraction of members with a new director')
+    parser.add_argument('--churn', type=float, default=0.005, help='fraction of members removed and added')
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    scrapper = ScraperNostroy(date_from=datetime(2009, 1, 1), date_to=datetime.now())
+    old = [scrapper.parse_page_info(make_nostroy_member(i, args.count)) for i in range(1, args.count + 1)]
+
+    churn = int(args.count * args.churn)
+    removed = set(rnd.sample(range(1, args.count + 1), churn))
+    new = [row.model_copy() for row in old if row.id not in removed]
+    new += [scrapper.parse_page_info(make_nostroy_member(i, args.count)) for i in range(args.count + 1, args.count + churn + 1)]
+    changed = rnd.sample(range(len(new) - churn), int(args.count * args.changed))
+    for i in changed:
+        new[i].director = f'{new[i].director} (новый)'
+
+    start = time.process_time()
+    changes = diff_rows(old, new, scrapper.row_model)
+    elapsed = time.process_time() - start
+    print(f'in memory: {len(old)} vs {len(new)} rows in {elapsed:.3f}s CPU, {changes.summary()}')
+    assert changes.count('changed') == len(changed)
+    assert changes.count('removed') == changes.count('added') == churn
+
+    # the way update_snapshot reads the previous snapshot, including the decoding of the rows
+    filepath = Path(tempfile.mkdtemp()) / 'nostroy.parquet'
+    with ParquetExporter(filepath, scrapper.registry, scrapper.row_model) as exporter:
+        exporter.write(old)
+    start = time.process_time()
+    changes = diff_values(iter_parquet_values(filepath), row_values(new, scrapper.row_model), scrapper.row_model)
+    elapsed = time.process_time() - start
+    print(f'parquet:   {len(old)} vs {len(new)} rows in {elapsed:.3f}s CPU, {changes.summary()}')
+    assert changes.count('changed') == len(changed)
+
+
+if __name__ == '__main__':
+    main()
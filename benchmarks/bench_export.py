@@ -0,0 +1,60 @@
+"""
+Write time and file size of a full snapshot in every export format.
+
+    python -m benchmarks.bench_export --count 200000
+    python -m benchmarks.bench_export --count 200000 --no-xlsx
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow.parquet as pq
+
+from benchmarks.fixtures import make_nopriz_member, make_nostroy_member
+from src.exporters import XlsxExporter, CsvExporter, ParquetExporter
+from src.scrappers.nopriz import ScraperNopriz
+from src.scrappers.nostroy import ScraperNostroy
+
+BATCH_SIZE = 1000  # rows per write, like the batches of the crawl
+
+
+def run(name: str, exporter, rows: list) -> None:
+    start = time.perf_counter()
+    with exporter:
+        for i in range(0, len(rows), BATCH_SIZE):
+            exporter.write(rows[i:i + BATCH_SIZE])
+    elapsed = time.perf_counter() - start
+    size = exporter.filepath.stat().st_size
+    print(f'{name:<10} {elapsed:>8.2f}s {len(rows) / elapsed:>12,.0f} rows/s {size / 2 ** 20:>8.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--no-xlsx', action='store_true', help='skip openpyxl, it takes minutes past 100k rows')
+    args = parser.parse_args()
+    dirpath = Path(tempfile.mkdtemp())
+
+    for scrapper_cls, make_member in (
+            (ScraperNopriz, make_nopriz_member),
+            (ScraperNostroy, make_nostroy_member),
+    ):
+        scrapper = scrapper_cls(date_from=datetime(2009, 1, 1), date_to=datetime.now())
+        rows = [scrapper.parse_page_info(make_member(i, args.count)) for i in range(1, args.count + 1)]
+        registry = scrapper.registry
+        print(f'{registry}: {args.count} rows')
+
+        if not args.no_xlsx:
+            run('xlsx', XlsxExporter(dirpath / f'{registry}.xlsx', registry), rows)
+        run('csv', CsvExporter(dirpath / f'{registry}.csv', registry), rows)
+        run('parquet', ParquetExporter(dirpath / f'{registry}.parquet', registry, scrapper.row_model), rows)
+
+        table = pq.read_table(dirpath / f'{registry}.parquet')
+        assert table.num_rows == len(rows)
+        assert table.column('id').to_pylist() == [row.id for row in rows]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Event-loop lag while tasks log at a high rate, with the synchronous handlers of the old get_logger
+against the queue handler and listener thread of src.my_logging.
+
+    python -m benchmarks.bench_logging --records 200000 --tasks 50
+    # console read slowly, as by a docker log driver or a terminal over ssh
+    python -m benchmarks.bench_logging --records 20000 --slow-console 0.5
+    python -m benchmarks.bench_logging --mode queue --json-lines
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.my_logging import get_logger, stop_logging
+
+PROBE_INTERVAL = 0.005  # seconds the lag probe sleeps
+
+
+class SlowStream:
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, s: str) -> int:
+        time.sleep(self.delay)
+        return self.stream.write(s)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def setup_sync(filename: Path) -> None:
+    # the handlers of get_logger before the queue
+    logging.basicConfig(
+        level=logging.INFO,
+        encoding='utf-8',
+        format="[{asctime}]:[{levelname}]:{message}",
+        style='{',
+        handlers=[
+            logging.FileHandler(filename, mode='a'),
+            logging.StreamHandler(sys.stdout),
+        ]
+    )
+
+
+async def probe(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def worker(n: int, records: int) -> None:
+    # a page of the discovery or a batch of the collection per record, like the scrapers log them
+    for page in range(records):
+        logging.info(f"filters={{'region': {n}}} | Page №: {page} ; Read items: 1000")
+        if page % 10 == 0:
+            await asyncio.sleep(0)
+
+
+async def run(records: int, tasks: int) -> tuple[float, list[float]]:
+    lags = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(n, records // tasks) for n in range(tasks)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+    return elapsed, lags
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=200_000)
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--mode', choices=('sync', 'queue'), default=None, help='both by default, one per process')
+    parser.add_argument('--json-lines', action='store_true')
+    parser.add_argument('--slow-console', type=float, default=0, help='ms every write to stdout takes')
+    args = parser.parse_args()
+
+    if args.mode is None:
+        for mode in ('sync', 'queue'):
+            cmd = [sys.executable, '-m', 'benchmarks.bench_logging', '--records', str(args.records),
+                   '--tasks', str(args.tasks), '--mode', mode, '--slow-console', str(args.slow_console)]
+            cmd += ['--json-lines'] if args.json_lines else []
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        return
+
+    filename = Path(tempfile.mkdtemp()) / 'bench.log'
+    # the report goes to stderr, stdout is the console handler
+    if args.slow_console:
+        sys.stdout = SlowStream(sys.stdout, args.slow_console / 1000)
+    if args.mode == 'sync':
+        setup_sync(filename)
+    else:
+        get_logger(filename, json_lines=args.json_lines)
+
+    elapsed, lags = asyncio.run(run(args.records, args.tasks))
+    if args.mode == 'queue':
+        start = time.perf_counter()
+        stop_logging()
+        drain = time.perf_counter() - start
+    else:
+        drain = 0
+
+    lags.sort()
+    lines = sum(1 for _ in open(filename, encoding='utf-8'))
+    print(f'{args.mode:<6} {args.records / elapsed:>10,.0f} records/s in the loop | loop lag '
+          f'p50 {statistics.median(lags) * 1000:.1f}ms, p99 {lags[int(len(lags) * 0.99)] * 1000:.1f}ms, '
+          f'max {lags[-1] * 1000:.1f}ms | drained in {drain:.2f}s | {lines} lines', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Rows/sec of parse_page_info against the previous strptime + full validation path.
+
+    python -m benchmarks.bench_rows --count 100000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks.fixtures import make_nopriz_member, make_nostroy_member
+from src.schemas import NoprizRow, NostroyRow
+from src.scrappers.nopriz import ScraperNopriz
+from src.scrappers.nostroy import ScraperNostroy
+
+
+def legacy_date(value: str, fmt: str) -> str:
+    return datetime.strptime(value, '%Y-%m-%dT%X%z').strftime(fmt)
+
+
+def legacy_nopriz(r: dict, date_format: str) -> NoprizRow:
+    return NoprizRow(
+        id=r['id'],
+        sro=r['sro'].get('full_description'),
+        registration_number=r['registration_number'],
+        full_description=r.get('full_description'),
+        short_description=r.get('short_description'),
+        member_type=r['member_type'].get('title') if r.get('member_type') else None,
+        registry_registration_date=legacy_date(
+            r['registry_registration_date'], date_format) if r.get('registry_registration_date') else None,
+        basis=r.get('basis'),
+        approved_basis_date=legacy_date(
+            r['approved_basis_date'], date_format) if r.get('approved_basis_date') else None,
+        ogrnip=r.get('ogrnip'),
+        inn=r.get('inn'),
+        phones=r.get('phones'),
+        full_address=NoprizRow.parse_full_address(r),
+        director=r.get('director'),
+        member_status=r['member_status'].get('title') if r.get('member_status') else None,
+        accordance_status=r['accordance_status'].get('title') if r.get('accordance_status') else None,
+        created_at=legacy_date(r['created_at'], date_format) if r.get('created_at') else None,
+        last_updated_at=legacy_date(
+            r['last_updated_at'], f'{date_format} %X') if r.get('last_updated_at') else None,
+        suspension_date=legacy_date(
+            r['suspension_date'], f'{date_format} %X') if r.get('suspension_date') else None,
+        suspension_reason=r.get('suspension_reason'),
+        member_right_vv=r['member_right_vv'].get('compensation_fund') if r.get('member_right_vv') else None,
+        member_right_odo=r['member_right_odo'].get('compensation_fund') if r.get('member_right_odo') else None
+    )
+
+
+def legacy_nostroy(r: dict, date_format: str) -> NostroyRow:
+    is_odo = None
+    if r.get('right') and r['right']['is_odo']:
+        is_odo = 'Действует без ограничений, в пределах фактического совокупного размера обязательств'
+    return NostroyRow(
+        id=r['id'],
+        sro=r['sro'].get('full_description'),
+        full_description=r.get('full_description'),
+        short_description=r.get('short_description'),
+        registration_number=r['registration_number'],
+        region=r.get('district'),
+        ogrnip=r.get('ogrnip'),
+        inn=r.get('inn'),
+        phones=r.get('phones'),
+        full_address=NostroyRow.parse_full_address(r),
+        director=r.get('director'),
+        accordance_status=r['accordance_status'].get('title') if r.get('accordance_status') else None,
+        member_type=r['member_type'].get('title') if r.get('member_type') else None,
+        registry_registration_date=legacy_date(
+            r['registry_registration_date'], date_format) if r.get('registry_registration_date') else None,
+        last_updated_at=legacy_date(
+            r['last_updated_at'], f'{date_format} %X') if r.get('last_updated_at') else None,
+        right_status=r['right']['right_status']['title'] if r.get('right') else None,
+        right_basis=r['right']['basis'] if r.get('right') else None,
+        is_simple=r['right']['is_simple'] if r.get('right') else None,
+        is_extremely_dangerous=r['right']['is_extremely_dangerous'] if r.get('right') else None,
+        is_nuclear=r['right']['is_nuclear'] if r.get('right') else None,
+        is_odo=is_odo,
+        responsibility_level_odo=f"{r['responsibility_level_odo']['title']}, "
+                                 f"{r['responsibility_level_odo']['cost']}" if r.get('responsibility_level_odo') else None,
+        responsibility_level_vv=f"{r['responsibility_level_vv']['title']}, "
+                                f"{r['responsibility_level_vv']['cost']}" if r.get('responsibility_level_vv') else None,
+        compensation_fund_fee_vv=r.get('compensation_fund_fee_vv'),
+        compensation_fund_fee_odo=r.get('compensation_fund_fee_odo'),
+        compensation_fund_fee_odopayment_date=legacy_date(
+            r['right']['compensation_fund_fee_odopayment_date'], f'{date_format} %X') if r.get('right') else None,
+    )
+
+
+def run(name: str, parse, records: list[dict]) -> list:
+    start = time.perf_counter()
+    rows = [parse(r) for r in records]
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24} {len(records) / elapsed:>12,.0f} rows/s')
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+
+    for scrapper_cls, make_member, legacy in (
+            (ScraperNopriz, make_nopriz_member, legacy_nopriz),
+            (ScraperNostroy, make_nostroy_member, legacy_nostroy),
+    ):
+        scrapper = scrapper_cls(date_from=datetime(2009, 1, 1), date_to=datetime.now())
+        records = [make_member(i, args.count) for i in range(1, args.count + 1)]
+        print(f'{scrapper.registry}: {args.count} records')
+        old = run('strptime + validation', lambda r: legacy(r, scrapper.date_format), records)
+        new = run('parse_page_info', scrapper.parse_page_info, records)
+        for a, b in zip(old, new):
+            assert a.model_dump(by_alias=True) == b.model_dump(by_alias=True), (a, b)
+
+
+if __name__ == '__main__':
+    main()
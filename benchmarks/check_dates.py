@@ -0,0 +1,104 @@
+"""
+Checks the fast paths of src.date_utils against the standard library on the formats of the
+registries: parse_datetime against datetime.strptime, parse_iso against datetime.fromisoformat,
+both in Moscow time, over 2000-2030 including the DST and UTC+4 years of Moscow.
+
+    python -m benchmarks.check_dates
+    python -m benchmarks.check_dates --count 1000000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+from src.date_utils import TZ_MSC, as_msk, compile_parser, parse_datetime, parse_iso, to_iso
+from src.scrappers.nostroy import REGISTRATION_DATE_FORMAT
+
+START = datetime(2000, 1, 1)
+# formats of the list items and of DATE_FORMAT; %f has no fast path and falls back to strptime
+FORMATS = [REGISTRATION_DATE_FORMAT, '%d.%m.%Y', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%d.%m.%Y %H:%M:%S.%f']
+# DST switches of Moscow: 2010-03-28 02:30 does not exist, 2010-10-31 02:30 happens twice
+EDGE_MOMENTS = [datetime(2010, 3, 28, 2, 30), datetime(2010, 10, 31, 2, 30), datetime(2011, 3, 27, 2, 30),
+                datetime(2014, 10, 26, 1, 30), datetime(2000, 2, 29), datetime(2030, 12, 31, 23, 59, 59)]
+BAD_VALUES = ['', '31.02.2015 10:11:12', '12.03.2015 24:00:00', '1.3.2015 10:11:12', '12/03/2015 10:11:12',
+              '12.03.+015 10:11:12', '12.03.2015 1a:11:12', '１２.03.2015 10:11:12', '12.03.2015 10:11:12 ']
+
+
+def strptime_msk(value: str, fmt: str) -> datetime | type:
+    try:
+        return datetime.strptime(value, fmt).replace(tzinfo=TZ_MSC)
+    except ValueError as ex:
+        return type(ex)
+
+
+def parse_datetime_or_error(value: str, fmt: str) -> datetime | type:
+    try:
+        return parse_datetime(value, fmt)
+    except ValueError as ex:
+        return type(ex)
+
+
+def same(a: datetime | type, b: datetime | type) -> bool:
+    # aware datetimes compare by the instant, the wall time and the fold must match too
+    if isinstance(a, type) or isinstance(b, type):
+        return a is b
+    return (a == b and a.replace(tzinfo=None) == b.replace(tzinfo=None)
+            and a.fold == b.fold and a.utcoffset() == b.utcoffset())
+
+
+def check_parse_datetime(moments: list[datetime]) -> int:
+    checks = 0
+    for fmt in FORMATS:
+        assert (compile_parser(fmt) is None) == ('%f' in fmt), fmt
+        for dt in moments:
+            value = dt.strftime(fmt)
+            assert same(parse_datetime_or_error(value, fmt), strptime_msk(value, fmt)), (value, fmt)
+            checks += 1
+        for value in BAD_VALUES:
+            assert same(parse_datetime_or_error(value, fmt), strptime_msk(value, fmt)), (value, fmt)
+            checks += 1
+    return checks
+
+
+def check_parse_iso(moments: list[datetime], rnd: random.Random) -> int:
+    checks = 0
+    for dt in moments:
+        micro = dt.replace(microsecond=rnd.randrange(1_000_000))
+        values = [
+            dt.strftime('%Y-%m-%dT%H:%M:%S+03:00'),  # nopriz
+            dt.strftime('%Y-%m-%dT%H:%M:%S'),  # naive, Moscow time
+            micro.isoformat(timespec='milliseconds') + '+03:00',
+            micro.isoformat(timespec='microseconds') + 'Z',
+            dt.strftime('%Y-%m-%dT%H:%M:%S-05:30'),
+        ]
+        for value in values:
+            want = datetime.fromisoformat(value)
+            if want.tzinfo is None:
+                want = want.replace(tzinfo=TZ_MSC)
+            got = parse_iso(value)
+            assert got == want and got.utcoffset() == want.utcoffset(), (value, got, want)
+            # compared in Moscow time, as the discovery does with date_from and date_to
+            # == of different zones is False for a time in a DST fold (PEP 495), the instants are compared
+            assert as_msk(got).timestamp() == got.timestamp() and as_msk(got).tzinfo is TZ_MSC, value
+            assert as_msk(got).replace(tzinfo=None) == want.astimezone(TZ_MSC).replace(tzinfo=None), value
+            # last_updated_at of the list and of /info are the same instant whatever the offset
+            assert to_iso(value) == want.astimezone(timezone.utc).isoformat(), value
+            checks += 1
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    moments = [START + timedelta(seconds=rnd.randrange(31 * 365 * 24 * 3600)) for _ in range(args.count)]
+    moments += EDGE_MOMENTS
+    checks = check_parse_datetime(moments)
+    print(f'parse_datetime == strptime: {checks} values in {len(FORMATS)} formats')
+    checks = check_parse_iso(moments, rnd)
+    print(f'parse_iso == fromisoformat: {checks} values')
+
+
+if __name__ == '__main__':
+    main()
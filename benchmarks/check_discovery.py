@@ -0,0 +1,64 @@
+"""
+Checks the discovery of ids against a local fake registry: date windows that end in the middle
+of a member list page stop reading it early, with `success` of the page before and after `data`.
+
+    python -m benchmarks.check_discovery
+    python -m benchmarks.check_discovery --count 5000 --page-size 70
+"""
+import argparse
+import asyncio
+import random
+
+from benchmarks.bench_crawl import SCRAPPERS, free_port
+from benchmarks.fake_registry import FakeRegistry, FakeRegistryConfig, serve
+from benchmarks.fixtures import REGISTRY_START, registration_date
+from src.transport import create_session
+
+
+async def check(registry: str, success_last: bool, args: argparse.Namespace, rnd: random.Random) -> int:
+    port = free_port()
+    config = FakeRegistryConfig(registry=registry, count=args.count, latency=0, success_last=success_last)
+    fake_registry = FakeRegistry(config)
+    runner = await serve(config, port=port)
+    checks = 0
+    try:
+        async with create_session() as session:
+            # the whole registry, then windows that start and end anywhere
+            windows = [(1, args.count)]
+            windows += [sorted(rnd.sample(range(1, args.count + 1), 2)) for _ in range(args.windows)]
+            for first, last in windows:
+                date_from = REGISTRY_START if first == 1 else registration_date(first, args.count)
+                date_to = registration_date(last, args.count)
+                scrapper = SCRAPPERS[registry](date_from=date_from, date_to=date_to, session=session,
+                                               base_url=f'http://127.0.0.1:{port}')
+                scrapper.ids_page_size = args.page_size
+                ids = sorted(await scrapper.collect_ids(filters={}))
+                # the dates as the scraper reads them: the fixtures write +03:00 in the UTC+4 years too
+                want = [id_ for id_ in range(1, args.count + 1) if scrapper.date_from
+                        <= scrapper._get_registration_date(fake_registry.list_item(id_)) <= scrapper.date_to]
+                assert ids == want, (registry, success_last, first, last, len(ids), len(want))
+                checks += 1
+    finally:
+        await runner.cleanup()
+    return checks
+
+
+async def run(args: argparse.Namespace) -> None:
+    rnd = random.Random(0)
+    for registry in SCRAPPERS:
+        for success_last in (False, True):
+            checks = await check(registry, success_last, args, rnd)
+            print(f'{registry}, success {"after" if success_last else "before"} data: {checks} windows')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--windows', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Checks that src.json_stream.JsonStream yields what json.loads does for member list pages split
+into chunks at every byte, including escapes and multi-byte UTF-8 cut mid-sequence, and that
+truncated pages raise ValueError instead of yielding a partial result.
+
+    python -m benchmarks.check_json_stream
+    python -m benchmarks.check_json_stream --chunk-sizes 1 2 3 7 64 --items 20
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from benchmarks.fixtures import make_nostroy_member
+from src.json_stream import JsonStream
+
+PATH = ('data', 'data')  # the array the scrapers stream
+EDGE_ITEMS = [
+    {'id': 1, 'full_description': 'ООО "Кавычки" \\ обратная черта\nперевод строки\tтаб', 'inn': '7701234567'},
+    {'id': 2, 'full_description': 'тест \U0001F600 эмодзи и é', 'escaped': '\\u0442'},
+    {'id': 3, 'numbers': [0, -1, 1.5, -2.25e-3, 1e21, 12345678901234567890], 'flags': [True, False, None]},
+    {'id': 4, 'nested': {'data': [1, 2], 'empty': {}, 'list': []}, 'key with spaces': ''},
+    {'id': 5, 'last': 9876543210},
+]
+
+
+def list_page(items: list, before_array: bool, indent: int | None, ensure_ascii: bool) -> bytes:
+    # the keys around the array are decoded into `rest`, the array may come first or last
+    data = {'data': items, 'count': len(items), 'countPages': 1}
+    page = {'data': data, 'success': True, 'message': 'Сообщение', 'total': -0.5}
+    if not before_array:
+        data = {'count': len(items), 'countPages': 1, 'data': items}
+        page = {'success': True, 'message': 'Сообщение', 'data': data, 'total': -0.5}
+    return json.dumps(page, indent=indent, ensure_ascii=ensure_ascii).encode()
+
+
+async def chunked(doc: bytes, bounds: list[int]):
+    start = 0
+    for end in bounds + [len(doc)]:
+        yield doc[start:end]
+        start = end
+
+
+async def parse(doc: bytes, bounds: list[int]) -> tuple[list, dict]:
+    rest = {}
+    items = [item async for item in JsonStream(chunked(doc, bounds)).iter_array(PATH, rest)]
+    return items, rest
+
+
+def expected(doc: bytes) -> tuple[list, dict]:
+    page = json.loads(doc)
+    items = page['data'].pop('data')
+    return items, page
+
+
+async def check(doc: bytes, chunk_sizes: list[int]) -> int:
+    want = expected(doc)
+    splits = [[i] for i in range(1, len(doc))]
+    splits += [list(range(size, len(doc), size)) for size in chunk_sizes]
+    for bounds in splits:
+        got = await parse(doc, bounds)
+        assert got == want, (doc, bounds, got, want)
+
+    # a page cut anywhere is an error, never a shorter list
+    for i in range(len(doc)):
+        try:
+            await parse(doc[:i], [i // 2])
+        except ValueError:
+            continue
+        raise AssertionError(f'no error for a page cut at {i} of {len(doc)} bytes: {doc[:i]!r}')
+    return len(splits)
+
+
+async def run(args: argparse.Namespace) -> None:
+    rnd = random.Random(0)
+    item_sets = [
+        [],
+        EDGE_ITEMS,
+        [make_nostroy_member(i, 1000, seed=rnd.randrange(1000)) for i in range(1, args.items + 1)],
+    ]
+    pages = checks = 0
+    for items in item_sets:
+        for before_array in (True, False):
+            for indent in (None, 2):
+                for ensure_ascii in (True, False):
+                    doc = list_page(items, before_array, indent, ensure_ascii)
+                    checks += await check(doc, args.chunk_sizes)
+                    pages += 1
+    print(f'{pages} pages, {checks} splits: JsonStream == json.loads')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=3, help='generated members per page, besides the edge cases')
+    parser.add_argument('--chunk-sizes', type=int, nargs='*', default=[1, 2, 3, 5, 64, 1024])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Local stand-in for the member list and member info API of reestr.nopriz.ru / reestr.nostroy.ru,
+and for the rotating proxies of config.PROXIES.
+
+    python -m benchmarks.fake_registry --registry nostroy --count 100000 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import math
+import random
+from functools import lru_cache
+
+from aiohttp import ClientSession, web
+from pydantic import BaseModel
+
+from benchmarks.fixtures import make_nopriz_member, make_nostroy_member
+
+BAN_PAGE = '<html><body>Access denied</body></html>'
+# not forwarded by the proxy in either direction
+HOP_HEADERS = {'host', 'connection', 'proxy-connection', 'keep-alive', 'content-length', 'transfer-encoding'}
+MAKE_MEMBER = {
+    'nopriz': make_nopriz_member,
+    'nostroy': make_nostroy_member,
+}
+
+
+class FakeRegistryConfig(BaseModel):
+    registry: str = 'nostroy'
+    count: int = 10_000
+    latency: float = 0.02  # seconds per response
+    latency_jitter: float = 0.5  # +- fraction of `latency`
+    error_rate: float = 0.  # 500
+    throttle_rate: float = 0.  # 429
+    ban_rate: float = 0.  # html page instead of JSON
+    hang_rate: float = 0.  # no response until the client times out
+    hang_time: float = 60.
+    max_page_size: int = 1000
+    etag: bool = False  # ETag on /info and 304 on a matching If-None-Match; the real registries send none
+    success_last: bool = False  # 'success' and 'message' of the member list after 'data'
+    seed: int = 0
+
+
+class FakeRegistry:
+
+    def __init__(self, config: FakeRegistryConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.make_member = lru_cache(maxsize=config.count)(MAKE_MEMBER[config.registry])
+        self.requests = {'list': 0, 'info': 0}
+        self.injected = {'error': 0, 'throttle': 0, 'ban': 0, 'hang': 0}
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/sro/all/member/list', self.member_list)
+        app.router.add_post('/api/member/{id:\\d+}/info', self.member_info)
+        return app
+
+    def member(self, id_: int) -> dict:
+        return self.make_member(id_, self.config.count)
+
+    def list_item(self, id_: int) -> dict:
+        member = self.member(id_)
+        item = {k: member[k] for k in ('id', 'full_description', 'inn', 'ogrnip', 'registration_number',
+                                       'registry_registration_date', 'last_updated_at')}
+        # nostroy filters by this one, nopriz by the ISO date
+        item['registry_registration_date_time_string'] = (
+            f"{item['registry_registration_date'][8:10]}.{item['registry_registration_date'][5:7]}."
+            f"{item['registry_registration_date'][:4]} {item['registry_registration_date'][11:19]}"
+        )
+        return item
+
+    async def respond(self, data: dict | None, status: int = 200, headers: dict | None = None) -> web.Response:
+        config = self.config
+        jitter = config.latency * config.latency_jitter
+        await asyncio.sleep(max(0., config.latency + self.random.uniform(-jitter, jitter)))
+
+        x = self.random.random()
+        for name, rate in (('error', config.error_rate), ('throttle', config.throttle_rate),
+                           ('ban', config.ban_rate), ('hang', config.hang_rate)):
+            if x < rate:
+                self.injected[name] += 1
+                break
+            x -= rate
+        else:
+            if data is None:
+                return web.Response(status=status, headers=headers)
+            return web.json_response(data, status=status, headers=headers)
+
+        if name == 'error':
+            return web.Response(status=500, text='Internal Server Error')
+        elif name == 'throttle':
+            return web.Response(status=429, text='Too Many Requests')
+        elif name == 'ban':
+            return web.Response(status=200, text=BAN_PAGE, content_type='text/html')
+        await asyncio.sleep(config.hang_time)
+        return web.json_response(data, status=status, headers=headers)
+
+    async def member_list(self, request: web.Request) -> web.Response:
+        self.requests['list'] += 1
+        body = await request.json()
+        page = int(body.get('page', 1))
+        page_size = min(int(body.get('pageCount', self.config.max_page_size)), self.config.max_page_size)
+
+        # newest registrations first, like the registries sort with registry_registration_date DESC
+        first = self.config.count - (page - 1) * page_size
+        ids = range(first, max(0, first - page_size), -1)
+        data = {
+            'data': [self.list_item(id_) for id_ in ids],
+            'count': self.config.count,
+            'countPages': math.ceil(self.config.count / page_size),
+        }
+        if self.config.success_last:
+            return await self.respond({'data': data, 'success': True, 'message': ''})
+        return await self.respond({'success': True, 'message': '', 'data': data})
+
+    async def member_info(self, request: web.Request) -> web.Response:
+        self.requests['info'] += 1
+        id_ = int(request.match_info['id'])
+        if not 1 <= id_ <= self.config.count:
+            return web.json_response({'success': False, 'message': 'Not found', 'data': None}, status=404)
+        member = self.member(id_)
+        if not self.config.etag:
+            return await self.respond({'success': True, 'message': '', 'data': member})
+        etag = f'"{id_}-{member["last_updated_at"]}"'
+        if request.headers.get('If-None-Match') == etag:
+            return await self.respond(None, status=304, headers={'ETag': etag})
+        return await self.respond({'success': True, 'message': '', 'data': member}, headers={'ETag': etag})
+
+
+async def serve(config: FakeRegistryConfig, host: str = '127.0.0.1', port: int = 8080) -> web.AppRunner:
+    runner = web.AppRunner(FakeRegistry(config).create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class FakeProxyConfig(BaseModel):
+    ban_after: int = 0  # requests an exit IP serves before it gets banned, 0 - never
+    ban_rate: float = 0.  # chance of a request to get the exit IP banned
+    change_ip_latency: float = 0.5  # seconds /change_ip takes
+    seed: int = 0
+
+
+class FakeProxy:
+    """
+    HTTP forward proxy with a change IP endpoint: a banned exit IP answers every request
+    with the ban page of the registries until /change_ip gives it a new one.
+    """
+
+    def __init__(self, config: FakeProxyConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.banned = False
+        self.ip_requests = 0
+        self.requests = {'forwarded': 0, 'banned': 0, 'change_ip': 0}
+        self._session: ClientSession | None = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/change_ip', self.change_ip)
+        # the proxied requests carry the absolute url of the registry
+        app.router.add_route('*', '/{path:.*}', self.forward)
+        app.on_cleanup.append(self.close)
+        return app
+
+    async def close(self, _app: web.Application | None = None) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    async def change_ip(self, request: web.Request) -> web.Response:
+        self.requests['change_ip'] += 1
+        await asyncio.sleep(self.config.change_ip_latency)
+        self.banned = False
+        self.ip_requests = 0
+        return web.json_response({'ok': True})
+
+    async def forward(self, request: web.Request) -> web.Response:
+        config = self.config
+        if not self.banned:
+            self.ip_requests += 1
+            if (config.ban_after and self.ip_requests > config.ban_after) or self.random.random() < config.ban_rate:
+                self.banned = True
+        if self.banned:
+            self.requests['banned'] += 1
+            return web.Response(status=200, text=BAN_PAGE, content_type='text/html')
+
+        self.requests['forwarded'] += 1
+        if self._session is None:
+            self._session = ClientSession(auto_decompress=False)
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        async with self._session.request(request.method, request.url, headers=headers,
+                                         data=await request.read()) as resp:
+            body = await resp.read()
+            headers = {k: v for k, v in resp.headers.items() if k.lower() not in HOP_HEADERS}
+            return web.Response(status=resp.status, body=body, headers=headers)
+
+
+async def serve_proxy(config: FakeProxyConfig, host: str = '127.0.0.1', port: int = 8081) -> tuple[web.AppRunner, FakeProxy]:
+    proxy = FakeProxy(config)
+    runner = web.AppRunner(proxy.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, proxy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    for name, field in FakeRegistryConfig.model_fields.items():
+        if field.annotation is bool:
+            parser.add_argument(f"--{name.replace('_', '-')}", action='store_true')
+        else:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default)
+    args = vars(parser.parse_args())
+    host, port = args.pop('host'), args.pop('port')
+
+    web.run_app(FakeRegistry(FakeRegistryConfig(**args)).create_app(), host=host, port=port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
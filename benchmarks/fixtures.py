@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+SROS = [f'Саморегулируемая организация Ассоциация строителей №{i}' for i in range(300)]
+REGIONS = ['г. Москва', 'г. Санкт-Петербург', 'Московская область', 'Республика Татарстан', 'Краснодарский край']
+STATUSES = [{'id': 1, 'title': 'Является членом'}, {'id': 2, 'title': 'Исключен'}]
+MEMBER_TYPES = [{'id': 1, 'title': 'Юридическое лицо'}, {'id': 2, 'title': 'Индивидуальный предприниматель'}]
+ACCORDANCE = [{'id': 1, 'title': 'Соответствует'}, {'id': 2, 'title': 'Не соответствует'}]
+REGISTRY_START = datetime(2009, 1, 1)
+
+
+def iso(dt: datetime) -> str:
+    return dt.strftime('%Y-%m-%dT%H:%M:%S+03:00')
+
+
+def registration_date(id_: int, count: int) -> datetime:
+    # newer ids are registered later, like in the registries
+    return REGISTRY_START + timedelta(minutes=int(id_ / count * 15 * 365 * 24 * 60))
+
+
+def make_address(rnd: random.Random) -> dict:
+    return {
+        'index': str(rnd.randint(100000, 999999)),
+        'country': 'Россия',
+        'subject': rnd.choice(REGIONS),
+        'district': rnd.choice([None, 'Центральный']),
+        'locality': rnd.choice(['Москва', 'Казань', None]),
+        'street': f'ул. Строителей',
+        'house': str(rnd.randint(1, 200)),
+        'building': rnd.choice([None, '', '2']),
+        'room': rnd.choice([None, str(rnd.randint(1, 500))]),
+    }
+
+
+def make_common(id_: int, count: int, rnd: random.Random) -> dict:
+    registered = registration_date(id_, count)
+    return {
+        'id': id_,
+        'sro': {'id': rnd.randint(1, 300), 'full_description': rnd.choice(SROS)},
+        'registration_number': rnd.choice([str(rnd.randint(1, 5000)), rnd.randint(1, 5000)]),
+        'full_description': f'Общество с ограниченной ответственностью «Строй-{id_}»',
+        'short_description': rnd.choice([f'ООО «Строй-{id_}»', '']),
+        'ogrnip': rnd.choice([rnd.randint(10 ** 12, 10 ** 13 - 1), str(rnd.randint(10 ** 12, 10 ** 13 - 1))]),
+        'inn': rnd.choice([rnd.randint(10 ** 9, 10 ** 10 - 1), str(rnd.randint(10 ** 9, 10 ** 10 - 1))]),
+        'phones': rnd.choice(['+7 (495) 123-45-67', '', None]),
+        'member_type': rnd.choice(MEMBER_TYPES),
+        'director': 'Иванов Иван Иванович',
+        'accordance_status': rnd.choice(ACCORDANCE + [None]),
+        'registry_registration_date': iso(registered),
+        'last_updated_at': iso(registered + timedelta(days=rnd.randint(0, 1000), seconds=rnd.randint(0, 86400))),
+        **make_address(rnd),
+    }
+
+
+def make_nopriz_member(id_: int, count: int = 100_000, seed: int | None = None) -> dict:
+    rnd = random.Random(id_ if seed is None else seed)
+    d = make_common(id_, count, rnd)
+    registered = registration_date(id_, count)
+    excluded = rnd.random() < 0.3
+    d.update({
+        'member_status': STATUSES[excluded],
+        'basis': f'Протокол №{rnd.randint(1, 300)} от {registered:%d.%m.%Y}',
+        'approved_basis_date': iso(registered.replace(hour=0, minute=0, second=0)),
+        'created_at': iso(registered),
+        'suspension_date': iso(registered + timedelta(days=rnd.randint(1, 2000))) if excluded else None,
+        'suspension_reason': 'Добровольный выход' if excluded else None,
+        'member_right_vv': {'compensation_fund': rnd.choice([50000, 150000.0, 500000])},
+        'member_right_odo': rnd.choice([None, {'compensation_fund': rnd.choice([150000, 350000.5])}]),
+    })
+    return d
+
+
+def make_nostroy_member(id_: int, count: int = 100_000, seed: int | None = None) -> dict:
+    rnd = random.Random(id_ if seed is None else seed)
+    d = make_common(id_, count, rnd)
+    registered = registration_date(id_, count)
+    d.update({
+        'right': rnd.choice([None, {
+            'right_status': {'id': 1, 'title': 'Действует'},
+            'basis': f'Решение №{rnd.randint(1, 300)}',
+            'is_simple': True,
+            'is_extremely_dangerous': rnd.choice([True, False]),
+            'is_nuclear': False,
+            'is_odo': rnd.choice([True, False]),
+            'compensation_fund_fee_odopayment_date': iso(registered.replace(hour=0, minute=0, second=0)),
+        }]),
+        'responsibility_level_odo': rnd.choice([None, {'title': 'Первый', 'cost': 'не превышает 90 млн руб.'}]),
+        'responsibility_level_vv': rnd.choice([None, {'title': 'Второй', 'cost': 'не превышает 500 млн руб.'}]),
+        'compensation_fund_fee_vv': rnd.choice([100000, '500000.00', None]),
+        'compensation_fund_fee_odo': rnd.choice([200000, None]),
+    })
+    return d
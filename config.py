@@ -4,7 +4,26 @@ DIR_SECRETS = Path('secrets')
 
 FILEPATH_SERVICE_ACCOUNT = DIR_SECRETS / 'service_account.json'
 FILEPATH_CERT = DIR_SECRETS / 'globalsign.cer'
+FILEPATH_DB = Path('members.sqlite3')
+DIR_CHECKPOINTS = Path('checkpoints')
+DIR_ARCHIVE = Path('archive')  # raw /info responses, see src/archive.py
+DIR_SNAPSHOTS = Path('snapshots')  # parquet snapshots of the store and change sets, see src/diff.py
+# /info responses, see src/http_cache.py; off in the scheduled and single runs, the registries send
+# no ETag/Last-Modified and stored members aren't fetched again, so it would never be hit
+FILEPATH_HTTP_CACHE = Path('http_cache.sqlite3')
+HTTP_CACHE_TTL = 24 * 60 * 60  # seconds an entry is served without a request
+HTTP_CACHE_MAX_BYTES = 2 * 2 ** 30
+LOG_MAX_BYTES = 50 * 2 ** 20  # size of a log file before it is rotated
+LOG_BACKUP_COUNT = 5
+LOG_JSON = False  # JSON lines in the log file instead of text
+LOG_PROGRESS_INTERVAL = 5  # seconds between progress records of the discovery and the collection
+METRICS_PORT = 9108  # Prometheus metrics of main.py on http://127.0.0.1:9108/metrics, None - off
 
 DATE_FORMAT = '%d.%m.%Y'
+
+# url: proxy url, None - direct connection; change_ip_url: rotates the exit IP of the proxy
+PROXIES = [
+    {'url': None, 'change_ip_url': 'http://node-de-71.astroproxy.com:10509/api/changeIP?apiToken=2de5dfea6b2c1e52'},
+]
 # URL_SPREADSHEET = 'https://docs.google.com/spreadsheets/d/1PGQ2ITMpRz9i9RzQSELT8GFexNun8fviHgUQwU57SxE/edit#gid=0'
 URL_SPREADSHEET = 'https://docs.google.com/spreadsheets/d/1PGQ2ITMpRz9i9RzQSELT8GFexNun8fviHgUQwU57SxE/edit#gid=0'
@@ -1,65 +1,244 @@
 import logging
 import asyncio
+import time
+from collections import defaultdict
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from typing import Type
 
+from aiohttp import ClientSession
+from apscheduler.events import (
+    EVENT_JOB_SUBMITTED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_MAX_INSTANCES,
+    JobSubmissionEvent,
+    JobExecutionEvent,
+)
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import DATE_FORMAT, URL_SPREADSHEET
+from config import DATE_FORMAT, URL_SPREADSHEET, DIR_ARCHIVE, DIR_SNAPSHOTS, METRICS_PORT
+from src.archive import RawArchive
+from src.diff import update_snapshot
 from src.my_logging import get_logger
 from src.scrappers.nopriz import ScraperNopriz
 from src.scrappers.nostroy import ScraperNostroy
+from src.scrappers.base import BaseScrapper
 from src.my_google import GoogleSheets
-from src.schemas import NoprizRow, NostroyRow
-from src.date_utils import TZ_MSC
+from src.pipeline import Pipeline, SheetsSink
+from src.storage import MemberStore
+from src.transport import create_session
+from src.date_utils import TZ_MSC, as_msk
+from src.metrics import REGISTRY, JOB_SECONDS, JOB_START_LAG, JOB_SKIPPED, DATA_LAG, start_metrics_server
 
 DATE_FROM = '01.02.2024'
 DATE_TO = datetime.now().date().strftime(DATE_FORMAT)
+REGISTRY_START = datetime(year=1900, month=1, day=1)
+SHEETS_BATCH_SIZE = 1000
+SCHEDULE_HOURS = '9-18'
+FULL_REFRESH_HOUR = 3
+MISFIRE_GRACE_TIME = 15 * 60  # seconds a run may start late, e.g. after a sleep of the host
+HIGH_WATER_MARK = 'high_water_mark'  # key in the state table of the store
+REGISTRIES = [
+    {'scrapper_cls': ScraperNopriz, 'sheet_index': 0, 'changes_sheet': 'nopriz_changes', 'max_concurrency': 20},
+    {'scrapper_cls': ScraperNostroy, 'sheet_index': 1, 'changes_sheet': 'nostroy_changes', 'max_concurrency': 50},
+]
+REGISTRY_LOCKS: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
 
 
 async def main():
+    if METRICS_PORT:
+        await start_metrics_server(METRICS_PORT)
     scheduler = AsyncIOScheduler(
         logger=logging.getLogger(),
         timezone=TZ_MSC
     )
-    scheduler.add_job(
-        func=scrap_all,
-        trigger='cron',
-        hour='9-18',  # UTC+3
-        # minute=0,
-        # second=30,
-        max_instances=1,
-    )
+    scheduler.add_listener(on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+    # registries are separate jobs, a slow one doesn't hold the other back; missed slots
+    # are coalesced into one run, a run still going on skips the slot instead of overlapping
+    for registry in REGISTRIES:
+        name = registry['scrapper_cls'].registry
+        scheduler.add_job(
+            func=scrap_registry_job,
+            trigger='cron',
+            hour=SCHEDULE_HOURS,  # UTC+3
+            id=f'{name}_incremental',
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=MISFIRE_GRACE_TIME,
+            kwargs={'registry': registry},
+        )
+        scheduler.add_job(
+            func=scrap_registry_job,
+            trigger='cron',
+            hour=FULL_REFRESH_HOUR,
+            id=f'{name}_full',
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=MISFIRE_GRACE_TIME,
+            kwargs={'registry': registry, 'full': True},
+        )
     scheduler.start()
 
 
+def on_job_event(event: JobSubmissionEvent | JobExecutionEvent) -> None:
+    if event.code == EVENT_JOB_SUBMITTED:
+        lag = (datetime.now(tz=TZ_MSC) - max(event.scheduled_run_times)).total_seconds()
+        JOB_START_LAG.set(lag, job=event.job_id)
+        if len(event.scheduled_run_times) > 1:
+            logging.warning(f'[{event.job_id}] {len(event.scheduled_run_times) - 1} missed runs coalesced')
+    elif event.code == EVENT_JOB_MISSED:
+        JOB_SKIPPED.inc(job=event.job_id, reason='missed')
+        logging.warning(f'[{event.job_id}] Run of {event.scheduled_run_time} missed')
+    elif event.code == EVENT_JOB_MAX_INSTANCES:
+        JOB_SKIPPED.inc(job=event.job_id, reason='running')
+        logging.warning(f'[{event.job_id}] Previous run is still going on, run of '
+                        f'{max(event.scheduled_run_times)} skipped')
+
+
+async def scrap_registry_job(registry: dict, full: bool = False) -> None:
+    # new and changed members since the high-water mark of the last successful run,
+    # `full` checks the whole registry for changes of old members
+    scrapper_cls = registry['scrapper_cls']
+    name = scrapper_cls.registry
+    job = f'{name}_{"full" if full else "incremental"}'
+    # the incremental and the full job of a registry don't run at the same time
+    async with REGISTRY_LOCKS[name]:
+        started_at = time.monotonic()
+        metrics_before = REGISTRY.snapshot()
+        date_to = datetime.now(tz=TZ_MSC)
+        outcome = 'error'
+        try:
+            with MemberStore() as store:
+                high_water_mark = store.get_state(name, HIGH_WATER_MARK)
+                if high_water_mark is not None:
+                    high_water_mark = as_msk(datetime.fromisoformat(high_water_mark))
+                    DATA_LAG.set((date_to - high_water_mark).total_seconds(), registry=name)
+                if full or high_water_mark is None:
+                    date_from = REGISTRY_START
+                else:
+                    # registration dates of nopriz have no time, the day of the mark is scanned again
+                    date_from = high_water_mark.replace(hour=0, minute=0, second=0, microsecond=0)
+                logging.info(f'[{job}] date_from={date_from} | date_to={date_to} | high-water mark: {high_water_mark}')
+
+                async with create_session() as session:
+                    await scrap_registry(store=store, session=session, date_from=date_from, date_to=date_to,
+                                         refresh=True, **registry)
+                # registrations after `date_to` are left for the next run
+                store.set_state(name, HIGH_WATER_MARK, date_to.isoformat(timespec='seconds'))
+            outcome = 'ok'
+        finally:
+            duration = time.monotonic() - started_at
+            JOB_SECONDS.observe(duration, job=job, outcome=outcome)
+            logging.info(f'[{job}] Finished: {outcome} in {duration:.0f}s')
+            logging.info(REGISTRY.summary(since=metrics_before))
+
+
+async def scrap_registry(
+        scrapper_cls: Type[BaseScrapper],
+        sheet_index: int,
+        store: MemberStore,
+        session: ClientSession,
+        date_from: datetime,
+        date_to: datetime,
+        date_format: str = DATE_FORMAT,
+        refresh: bool = False,
+        max_concurrency: int | None = None,
+        sheets_batch_size: int = SHEETS_BATCH_SIZE,
+        archive: bool = False,
+        changes_sheet: str | None = None
+) -> int:
+    registry = scrapper_cls.registry
+    row_model = scrapper_cls.row_model
+    started_at = time.monotonic()
+    logging.info(f'[{registry}] Start scraping')
+
+    async with GoogleSheets() as gs:
+        await gs.open_spreadsheet(URL_SPREADSHEET)
+        await gs.get_or_add_worksheet(sheet_index, name=registry)
+
+        with RawArchive(DIR_ARCHIVE, registry) if archive else nullcontext() as raw_archive:
+            async with scrapper_cls(date_format=date_format, date_from=date_from, date_to=date_to, store=store,
+                                    session=session, max_concurrency=max_concurrency,
+                                    archive=raw_archive) as scrapper:
+                if refresh:
+                    # new and changed members are fetched while the discovery goes on
+                    ids = scrapper.iter_ids(filters={}, updated_only=True)
+                    to_fetch = None
+                else:
+                    ids = await scrapper.collect_ids(filters={})
+                    # members fetched by earlier runs are synced from the store, the rest as they arrive
+                    stored_ids = store.get_ids(registry)
+                    stored = [id_ for id_ in ids if id_ in stored_ids]
+                    to_fetch = len(ids) - len(stored)
+                    await gs.fill_new_rows(store.get_rows(registry, row_model, stored), row_model=row_model)
+
+                # the sheet is written by its own stage, so fetching goes on during the Sheets calls
+                sink = SheetsSink(gs, row_model, update_existing=refresh, batch_size=sheets_batch_size)
+                collected = await Pipeline(scrapper, sinks=[sink]).run(ids, refetch=refresh)
+
+        # what changed in the registry since the previous run, not only which rows are new
+        changes = await asyncio.to_thread(update_snapshot, store.filepath, registry, row_model)
+        if changes is not None:
+            logging.info(f'[{registry}] Changes since the last snapshot: {changes.summary()}')
+        if changes is not None and changes.changes:
+            changes.write_csv(DIR_SNAPSHOTS / f'{registry}_changes_{changes.created_at:%Y%m%d_%H%M%S}.csv', row_model)
+            if changes_sheet is not None:
+                await gs.get_or_add_worksheet_by_title(changes_sheet)
+                await gs.get_ids_index()
+                await gs.append(changes.to_records(row_model), append_columns=gs.last_row == 0)
+
+    logging.info(f'[{registry}] Done: {collected}/{to_fetch or "?"} members in {time.monotonic() - started_at:.0f}s | '
+                 f'{scrapper.format_limiter_state()}')
+    return collected
+
+
 async def scrap_all(
         date_from: datetime | None = None,
         date_to: datetime | None = None,
-        date_format: str = DATE_FORMAT
+        date_format: str = DATE_FORMAT,
+        refresh: bool = False,
+        registries: list[dict] | None = None,
+        archive: bool = False
 ) -> None:
     if date_to is None:
-        date_to = datetime.now()
+        date_to = datetime.now(tz=TZ_MSC)
 
     if date_from is None:
         date_from = date_to - timedelta(days=1)
-        date_from.replace(hour=0, minute=0, second=0, microsecond=0)
+        date_from = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
 
     logging.info(f'date_from={date_from} | date_to={date_to}')
 
-    async with GoogleSheets() as gs:
-        await gs.open_spreadsheet(URL_SPREADSHEET)
+    # registries live on separate hosts with separate limits, so they are scraped concurrently
+    # through one pooled session
+    registries = registries or REGISTRIES
+    metrics_before = REGISTRY.snapshot()
+    # no HTTP cache: the registries send no validators and the ids of the store are skipped anyway,
+    # every /info request of a run is for a new or changed member
+    with MemberStore() as store:
+        async with create_session() as session:
+            results = await asyncio.gather(*[
+                scrap_registry(
+                    store=store,
+                    session=session,
+                    date_from=date_from,
+                    date_to=date_to,
+                    date_format=date_format,
+                    refresh=refresh,
+                    archive=archive,
+                    **registry
+                )
+                for registry in registries
+            ], return_exceptions=True)
+    logging.info(REGISTRY.summary(since=metrics_before))
 
-        logging.info(f'Start scraping nopriz')
-        async with ScraperNopriz(date_format=date_format, date_from=date_from, date_to=date_to) as scrapper:
-            data = await scrapper.collect_data()
-            await gs.get_or_add_worksheet(0, name='nopriz')
-            await gs.fill_new_rows(data, row_model=NoprizRow)
-
-        logging.info(f'Start scraping nostroy')
-        async with ScraperNostroy(date_format=date_format, date_from=date_from, date_to=date_to) as scrapper:
-            data = await scrapper.collect_data()
-            await gs.get_or_add_worksheet(1, name='nostroy')
-            await gs.fill_new_rows(data, row_model=NostroyRow)
+    errors = []
+    for registry, result in zip(registries, results):
+        if isinstance(result, BaseException):
+            logging.error(f'[{registry["scrapper_cls"].registry}] Failed', exc_info=result)
+            errors.append(result)
+    if errors:
+        raise errors[0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from config import DATE_FORMAT, FILEPATH_DB
+from src.exporters import XlsxExporter
+from src.my_logging import get_logger
+from src.parallel import crawl_parallel
+from src.scrappers.nostroy import ScraperNostroy
+from src.schemas import FiltersNostroy
+from src.storage import MemberStore
+
+# full historic rebuild of one registry in several processes, see src/parallel.py
+DATE_FROM = '01.01.1900'
+DATE_TO = datetime.now().date().strftime(DATE_FORMAT)
+SCRAPPER_CLS = ScraperNostroy
+FILTERS = FiltersNostroy(member_status=1, sro_enabled=True)  # None for ScraperNopriz
+PROCESSES = min(4, os.cpu_count())  # more rarely pays off: the registry and the proxies are the limit
+MAX_CONCURRENCY = 40  # over all processes
+LOG_FILENAME = Path(__file__).stem + '.log'
+
+
+async def main():
+    date_from = datetime.strptime(DATE_FROM, DATE_FORMAT)
+    date_to = datetime.strptime(DATE_TO, DATE_FORMAT)
+
+    # the discovery is a few list pages, it stays in this process and is journaled as usual
+    with MemberStore(FILEPATH_DB) as store:
+        async with SCRAPPER_CLS(date_format=DATE_FORMAT, date_from=date_from, date_to=date_to,
+                                store=store) as scrapper:
+            ids = await scrapper.get_ids(filters=FILTERS)
+            journal_filepath = scrapper.journal.filepath
+
+        await crawl_parallel(
+            SCRAPPER_CLS, ids, PROCESSES,
+            db_filepath=FILEPATH_DB,
+            journal_filepath=journal_filepath,
+            log_filename=LOG_FILENAME,
+            date_format=DATE_FORMAT,
+            date_from=date_from,
+            date_to=date_to,
+            max_concurrency=MAX_CONCURRENCY,
+        )
+
+        filepath = Path(scrapper.get_filename(scrapper.registry)).with_suffix('.xlsx')
+        with XlsxExporter(filepath, scrapper.registry) as exporter:
+            exporter.write(store.iter_rows(scrapper.registry, SCRAPPER_CLS.row_model, ids))
+
+
+if __name__ == '__main__':
+    get_logger(LOG_FILENAME)
+
+    try:
+        asyncio.run(main())
+    except Exception as ex:
+        logging.error(ex, exc_info=True)
+        exit(1)
@@ -1,49 +1,28 @@
 import asyncio
 import logging
-import time
+from contextlib import ExitStack
 from datetime import datetime
 from pathlib import Path
 
-from openpyxl import Workbook, load_workbook
-
-from config import DATE_FORMAT
+from config import DATE_FORMAT, DIR_ARCHIVE
+from src.archive import RawArchive
+from src.exporters import XlsxExporter, CsvExporter, ParquetExporter
 from src.my_logging import get_logger
+from src.pipeline import Pipeline, ExporterSink
 from src.scrappers.nopriz import ScraperNopriz
 from src.scrappers.nostroy import ScraperNostroy
 from src.schemas import NostroyRow, NoprizRow, FiltersNostroy
+from src.storage import MemberStore
 
 DATE_FROM = '01.01.1900'
 # DATE_TO = '09.04.2024'
 # DATE_FROM = '10.04.2024'
 DATE_TO = datetime.now().date().strftime(DATE_FORMAT)
-
-
-def write_data_to_excel(filepath: Path, data: list[NoprizRow | NostroyRow]) -> None:
-    if filepath.exists():
-        wb = load_workbook(filepath)
-        ws = wb.worksheets[0]
-    else:
-        wb = Workbook()
-        ws = wb.worksheets[0]
-        columns = list(data[0].dict(by_alias=True).keys())
-        ws.append(columns)
-
-    i = 0
-    while True:
-        try:
-            for r in data:
-                d = r.dict(by_alias=True)
-                ws.append(list(d.values()))
-
-            wb.save(filepath)
-            logging.info(f'{filepath} was written')
-            break
-        except PermissionError as ex:
-            logging.info('Please close the file')
-            i += 1
-            time.sleep(10)
-            if i == 500:
-                raise ex
+# re-parse the archived responses instead of crawling, offline
+REPLAY = False
+# snapshots next to the .xlsx, written from the same row stream
+EXPORT_CSV = False
+EXPORT_PARQUET = True
 
 
 async def main():
@@ -54,25 +33,47 @@ async def main():
     # async with ScraperNopriz(date_format=DATE_FORMAT, date_from=date_from, date_to=date_to) as scrapper:
     #     ids = await scrapper.collect_ids()
     #     filepath = Path(scrapper.get_filename('nopriz')).with_suffix('.xlsx')
-    #     for data in await scrapper.collect_data(ids):
-    #         write_data_to_excel(filepath, data)
-
-    async with ScraperNostroy(proxy_url=proxy_url, date_format=DATE_FORMAT, date_from=date_from, date_to=date_to) as scrapper:
-        filters = FiltersNostroy(member_status=1, sro_enabled=True)
-        ids = await scrapper.get_ids(filters=filters)
-        filepath = Path(scrapper.get_filename('nostroy')).with_suffix('.xlsx')
-
-        data_to_append = []
-        async for data in scrapper.collect_data(ids):
-            for row in data:
-                data_to_append.append(row)
-
-            if len(data_to_append) >= 10000:
-                write_data_to_excel(filepath=filepath, data=data_to_append)
-                data_to_append = []
-
-        if data_to_append:
-            write_data_to_excel(filepath=filepath, data=data_to_append)
+    #     with XlsxExporter(filepath, scrapper.registry) as exporter:
+    #         async for data in scrapper.collect_data(ids):
+    #             exporter.write(data)
+
+    if REPLAY:
+        # offline: the ids and their responses come from the archive, no session is opened
+        with MemberStore() as store, RawArchive(DIR_ARCHIVE, ScraperNostroy.registry) as archive:
+            scrapper = ScraperNostroy(date_format=DATE_FORMAT, date_from=date_from, date_to=date_to,
+                                      store=store, archive=archive)
+            ids = sorted(archive.offsets)
+            with ExitStack() as stack:
+                sinks = open_sinks(stack, Path(scrapper.get_filename('nostroy')), scrapper.registry)
+                for _ in scrapper.replay_data(ids):
+                    pass
+                for sink in sinks:
+                    sink.exporter.write(store.iter_rows(scrapper.registry, NostroyRow, ids))
+        return
+
+    with MemberStore() as store, RawArchive(DIR_ARCHIVE, ScraperNostroy.registry) as archive:
+        async with ScraperNostroy(proxy_url=proxy_url, date_format=DATE_FORMAT, date_from=date_from, date_to=date_to,
+                                  store=store, archive=archive) as scrapper:
+            filters = FiltersNostroy(member_status=1, sro_enabled=True)
+            ids = await scrapper.get_ids(filters=filters)
+            with ExitStack() as stack:
+                sinks = open_sinks(stack, Path(scrapper.get_filename('nostroy')), scrapper.registry)
+                # members fetched by earlier runs go first, the rest are written while they are fetched
+                stored_ids = store.get_ids(scrapper.registry)
+                stored = [id_ for id_ in ids if id_ in stored_ids]
+                for sink in sinks:
+                    sink.exporter.write(store.iter_rows(scrapper.registry, NostroyRow, stored))
+                await Pipeline(scrapper, sinks=sinks).run(ids)
+
+
+def open_sinks(stack: ExitStack, filepath: Path, registry: str) -> list[ExporterSink]:
+    sinks = [ExporterSink(stack.enter_context(XlsxExporter(filepath.with_suffix('.xlsx'), registry)), 'xlsx')]
+    if EXPORT_CSV:
+        sinks.append(ExporterSink(stack.enter_context(CsvExporter(filepath.with_suffix('.csv'), registry)), 'csv'))
+    if EXPORT_PARQUET:
+        sinks.append(ExporterSink(stack.enter_context(
+            ParquetExporter(filepath.with_suffix('.parquet'), registry, NostroyRow)), 'parquet'))
+    return sinks
 
 
 if __name__ == '__main__':
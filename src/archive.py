@@ -0,0 +1,144 @@
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, Self
+
+import zstandard
+
+RECORD_HEADER = struct.Struct('<QI')  # member id, length of the compressed response
+INDEX_ENTRY = struct.Struct('<QQ')  # member id, offset of its record in the segment
+
+
+class RawArchive:
+    """
+    Append-only archive of raw /info responses of one registry: `<registry>.seg` holds
+    length-prefixed zstd frames, `<registry>.idx` the offset of every record in append order.
+    A re-fetched member is appended again, the last record of an id wins.
+    """
+    compression_level: int = 3
+
+    def __init__(self, dirpath: Path, registry: str):
+        self.segment_path = dirpath / f'{registry}.seg'
+        self.index_path = dirpath / f'{registry}.idx'
+        self.offsets: dict[int, int] = {}
+        self._end = 0
+        self._mmap: mmap.mmap | None = None
+        self._compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+        dirpath.mkdir(parents=True, exist_ok=True)
+        self._segment = open(self.segment_path, 'ab')
+        self._index = open(self.index_path, 'ab')
+        self._load()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, id_: int) -> bool:
+        return id_ in self.offsets
+
+    def _load(self) -> None:
+        # the segment is written before the index, so after a crash the index may miss
+        # the last records and the segment may end with a torn one
+        size = self.segment_path.stat().st_size
+        data = self.index_path.read_bytes()
+        entries = list(INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]))
+
+        with open(self.segment_path, 'rb') as f:
+            while entries:
+                id_, offset = entries[-1]
+                f.seek(offset)
+                header = f.read(RECORD_HEADER.size)
+                if len(header) == RECORD_HEADER.size:
+                    end = offset + RECORD_HEADER.size + RECORD_HEADER.unpack(header)[1]
+                    if end <= size:
+                        self._end = end
+                        break
+                entries.pop()
+
+            missing = []
+            f.seek(self._end)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                id_, length = RECORD_HEADER.unpack(header)
+                if self._end + RECORD_HEADER.size + length > size:
+                    break
+                missing.append((id_, self._end))
+                self._end += RECORD_HEADER.size + length
+                f.seek(self._end)
+
+        if len(entries) * INDEX_ENTRY.size != len(data):
+            self._index.truncate(len(entries) * INDEX_ENTRY.size)
+        if self._end != size:
+            self._segment.truncate(self._end)
+        if missing:
+            self._index.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in missing))
+            self._index.flush()
+
+        self.offsets = dict(entries + missing)
+
+    def append(self, records: Iterable[tuple[int, dict]]) -> None:
+        chunks = []
+        entries = []
+        offset = self._end
+        for id_, raw in records:
+            frame = self._compressor.compress(json.dumps(raw, ensure_ascii=False, separators=(',', ':')).encode())
+            chunks.append(RECORD_HEADER.pack(id_, len(frame)))
+            chunks.append(frame)
+            entries.append((id_, offset))
+            offset += RECORD_HEADER.size + len(frame)
+        if not entries:
+            return
+
+        self._segment.write(b''.join(chunks))
+        self._segment.flush()
+        self._index.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in entries))
+        self._index.flush()
+        self._end = offset
+        self.offsets.update(entries)
+
+    def _view(self) -> mmap.mmap:
+        # the segment only grows, so the map is recreated when it no longer covers the end
+        if self._mmap is None or len(self._mmap) < self._end:
+            if self._mmap is not None:
+                self._mmap.close()
+            with open(self.segment_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _read(self, view: mmap.mmap, offset: int) -> dict:
+        _, length = RECORD_HEADER.unpack_from(view, offset)
+        start = offset + RECORD_HEADER.size
+        return json.loads(self._decompressor.decompress(view[start:start + length]))
+
+    def get(self, id_: int) -> dict | None:
+        offset = self.offsets.get(id_)
+        if offset is None:
+            return None
+        return self._read(self._view(), offset)
+
+    def iter_raw(self, ids: Iterable[int] | None = None) -> Iterator[tuple[int, dict]]:
+        if not self.offsets:
+            return
+        ids = sorted(self.offsets if ids is None else (id_ for id_ in ids if id_ in self.offsets))
+        view = self._view()
+        for id_ in ids:
+            yield id_, self._read(view, self.offsets[id_])
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        for f in (self._segment, self._index):
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
@@ -0,0 +1,82 @@
+import os
+from array import array
+from pathlib import Path
+from typing import Iterable, Self
+
+from src.id_set import IdSet
+
+
+class CrawlJournal:
+    """
+    Append-only journal of one crawl. Each line is `<kind> <id>`:
+    d - discovered, c - completed, f - failed; a single `e` line closes the discovery.
+    """
+
+    def __init__(self, filepath: Path):
+        self.filepath = filepath
+        self.discovered = array('I')
+        self.discovery_finished = False
+        self.completed = IdSet()
+        self.failed: set[int] = set()
+
+        torn = False
+        if filepath.exists():
+            torn = self._load()
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(filepath, 'a')
+        if torn:
+            self._write('\n')
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _load(self) -> bool:
+        discovered = array('I')
+        line = '\n'
+        with open(self.filepath, 'r') as f:
+            for line in f:
+                kind, _, id_ = line.rstrip('\n').partition(' ')
+                if kind == 'e':
+                    self.discovered, discovered = discovered, array('I')
+                    self.discovery_finished = True
+                    continue
+                elif not line.endswith('\n') or not id_.isdigit():
+                    continue
+
+                if kind == 'c':
+                    self.completed.add(int(id_))
+                    self.failed.discard(int(id_))
+                elif kind == 'f':
+                    self.failed.add(int(id_))
+                elif kind == 'd':
+                    discovered.append(int(id_))
+
+        # the last line is torn if the process died in the middle of a write
+        return not line.endswith('\n')
+
+    def _write(self, lines: str) -> None:
+        self._f.write(lines)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def record_discovered(self, ids: Iterable[int]) -> None:
+        self.discovered = array('I', ids)
+        self._write(''.join(f'd {id_}\n' for id_ in self.discovered) + 'e\n')
+        self.discovery_finished = True
+
+    def record_completed(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        self._write(''.join(f'c {id_}\n' for id_ in ids))
+        self.completed.update(ids)
+        self.failed.difference_update(ids)
+
+    def record_failed(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        self._write(''.join(f'f {id_}\n' for id_ in ids))
+        self.failed.update(ids)
+
+    def close(self) -> None:
+        self._f.close()
@@ -1,6 +1,123 @@
-from datetime import datetime
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any
 from zoneinfo import ZoneInfo
 
 
 # TZ_UTC = ZoneInfo('UTC')
 TZ_MSC = ZoneInfo('Europe/Moscow')
+
+ISO_FORMAT = '%Y-%m-%dT%X%z'
+ISO_DATETIME_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:Z|[+-]\d\d:?\d\d)')
+# strftime directives of numeric fields -> groups of ISO_DATETIME_RE
+DIRECTIVES = {
+    '%Y': '{0}', '%m': '{1}', '%d': '{2}',
+    '%H': '{3}', '%M': '{4}', '%S': '{5}', '%X': '{3}:{4}:{5}',
+    '%%': '%',
+}
+
+
+# fixed width strptime directives -> (width, position in an ISO datetime)
+PARSE_DIRECTIVES = {
+    '%Y': (4, 0), '%m': (2, 1), '%d': (2, 2),
+    '%H': (2, 3), '%M': (2, 4), '%S': (2, 5),
+}
+ISO_PARTS_DEFAULTS = (None, None, None, '00', '00', '00')
+
+
+def as_msk(dt: datetime) -> datetime:
+    # naive datetimes of the config and the registries are Moscow wall time
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=TZ_MSC)
+    return dt.astimezone(TZ_MSC)
+
+
+def parse_iso(value: str) -> datetime:
+    # the offset of the registry is kept, aware datetimes compare by the instant
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo is not None else dt.replace(tzinfo=TZ_MSC)
+
+
+@lru_cache(maxsize=None)
+def compile_parser(fmt: str) -> tuple[int, itemgetter | None, Any, itemgetter, str] | None:
+    # strptime format -> length of the values, getter and values of its literal chars, getter of
+    # the numbers and the ISO template they are put in; None if the format has a directive
+    # of variable width or no date
+    positions = [None] * len(ISO_PARTS_DEFAULTS)
+    slices, literal_positions, reference = [], [], []
+    pos = 0
+    for part in re.split(r'(%.)', fmt):
+        if part.startswith('%') and len(part) == 2:
+            if part not in PARSE_DIRECTIVES or positions[PARSE_DIRECTIVES[part][1]] is not None:
+                return None
+            width, iso_position = PARSE_DIRECTIVES[part]
+            positions[iso_position] = len(slices)
+            slices.append(slice(pos, pos + width))
+            reference.append('0' * width)
+            pos += width
+        else:
+            literal_positions.extend(range(pos, pos + len(part)))
+            reference.append(part)
+            pos += len(part)
+    if None in positions[:3]:
+        return None
+
+    parts = [default if i is None else f'{{{i}}}' for i, default in zip(positions, ISO_PARTS_DEFAULTS)]
+    template = '{}-{}-{}T{}:{}:{}'.format(*parts)
+    literals_getter = itemgetter(*literal_positions) if literal_positions else None
+    literals = literals_getter(''.join(reference)) if literals_getter else None
+    return pos, literals_getter, literals, itemgetter(*slices), template
+
+
+def parse_datetime(value: str, fmt: str) -> datetime:
+    # same result as datetime.strptime(value, fmt) in Moscow time: the numbers are cut out
+    # at the positions of the compiled format and parsed by fromisoformat
+    parser = compile_parser(fmt)
+    if parser is not None:
+        length, literals_getter, literals, parts_getter, template = parser
+        if len(value) == length and (literals_getter is None or literals_getter(value) == literals):
+            try:
+                return datetime.fromisoformat(template.format(*parts_getter(value))).replace(tzinfo=TZ_MSC)
+            except ValueError:
+                pass
+    return datetime.strptime(value, fmt).replace(tzinfo=TZ_MSC)
+
+
+def to_iso(value: str | None) -> str | None:
+    # registries send the same timestamp with different offsets/precision, compare canonical form:
+    # the instant in UTC, naive values are Moscow time
+    if not value:
+        return None
+    try:
+        return as_msk(datetime.fromisoformat(value)).astimezone(timezone.utc).isoformat()
+    except ValueError:
+        return value
+
+
+@lru_cache(maxsize=None)
+def compile_format(fmt: str) -> str | None:
+    # strftime format -> str.format template over ISO_DATETIME_RE groups, None if it has other directives
+    template = []
+    for part in re.split(r'(%.)', fmt):
+        if part.startswith('%') and len(part) == 2:
+            if part not in DIRECTIVES:
+                return None
+            template.append(DIRECTIVES[part])
+        else:
+            template.append(part.replace('{', '{{').replace('}', '}}'))
+    return ''.join(template)
+
+
+@lru_cache(maxsize=2 ** 16)
+def format_iso(value: str, fmt: str) -> str:
+    # same result as datetime.strptime(value, ISO_FORMAT).strftime(fmt) by slicing the string
+    template = compile_format(fmt)
+    m = ISO_DATETIME_RE.fullmatch(value)
+    if template is None or m is None or value[0] == '0':
+        return datetime.strptime(value, ISO_FORMAT).strftime(fmt)
+
+    # raises on the same out of range values as strptime
+    datetime(*map(int, m.groups()))
+    return template.format(*m.groups())
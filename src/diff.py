@@ -0,0 +1,208 @@
+import csv
+import logging
+import os
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Type
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+
+from config import DIR_SNAPSHOTS
+from src.exporters import ParquetExporter
+from src.schemas import BaseRow
+from src.storage import MemberStore
+
+KIND_TITLES = {'added': 'Добавлен', 'removed': 'Исключен из реестра', 'changed': 'Изменен'}
+
+
+class FieldDelta(BaseModel):
+    field: str
+    old: Any = None
+    new: Any = None
+
+
+class MemberChange(BaseModel):
+    id: int
+    kind: str  # added, removed, changed
+    full_description: str | None = None
+    deltas: list[FieldDelta] = []
+
+
+class ChangeSet(BaseModel):
+    registry: str
+    created_at: datetime
+    changes: list[MemberChange] = []
+
+    def count(self, kind: str) -> int:
+        return sum(1 for change in self.changes if change.kind == kind)
+
+    def summary(self) -> str:
+        return (f'added: {self.count("added")}, removed: {self.count("removed")}, '
+                f'changed: {self.count("changed")}')
+
+    def to_records(self, row_model: Type[BaseRow]) -> list[dict]:
+        # one record per changed field, with the Russian headers of the export
+        fields = row_model.model_fields
+        created_at = self.created_at.strftime('%d.%m.%Y %X')
+        records = []
+        for change in self.changes:
+            record = {
+                'Дата': created_at,
+                'id': change.id,
+                'Полное наименование': change.full_description,
+                'Изменение': KIND_TITLES[change.kind],
+            }
+            if not change.deltas:
+                records.append({**record, 'Поле': None, 'Было': None, 'Стало': None})
+            for delta in change.deltas:
+                records.append({
+                    **record,
+                    'Поле': fields[delta.field].alias or delta.field,
+                    'Было': delta.old,
+                    'Стало': delta.new,
+                })
+        return records
+
+    def write_csv(self, filepath: Path, row_model: Type[BaseRow]) -> None:
+        records = self.to_records(row_model)
+        with open(filepath, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=';')
+            if records:
+                writer.writerow(records[0].keys())
+            writer.writerows(record.values() for record in records)
+        logging.info(f'{filepath} was written: {len(records)} changes')
+
+    def write_jsonl(self, filepath: Path) -> None:
+        with open(filepath, 'w', encoding='utf-8') as f:
+            for change in self.changes:
+                f.write(change.model_dump_json() + '\n')
+        logging.info(f'{filepath} was written: {len(self.changes)} changes')
+
+
+def row_values(rows: Iterable[BaseRow], row_model: Type[BaseRow]) -> Iterator[tuple]:
+    # field values in the order of the model, id first; __dict__ lookups are faster than getattr
+    getter = itemgetter(*row_model.model_fields)
+    return (getter(row.__dict__) for row in rows)
+
+
+def diff_values(
+        old: Iterable[tuple],
+        new: Iterable[tuple],
+        row_model: Type[BaseRow],
+        registry: str = '',
+        ignore: Iterable[str] = ()
+) -> ChangeSet:
+    """
+    Sorted merge of two snapshots given as tuples of field values in the order of `row_model`,
+    both ascending by id as the store and the parquet snapshots yield them. Equal tuples cost
+    one comparison, field deltas are computed for the unequal ones only.
+    Fields in `ignore` alone don't make a change.
+    """
+    names = list(row_model.model_fields)
+    assert names[0] == 'id'
+    i_description = names.index('full_description')
+    ignored = {names.index(name) for name in ignore}
+    # ИНН and ОГРН are numbers in the store and strings in parquet, the same value either way
+    str_fields = {i for i, field in enumerate(row_model.model_fields.values()) if field.annotation == int | str | None}
+
+    def deltas(a: tuple, b: tuple) -> list[FieldDelta]:
+        return [
+            FieldDelta(field=names[i], old=x, new=y)
+            for i, (x, y) in enumerate(zip(a, b))
+            if x != y and i not in ignored and not (i in str_fields and str(x) == str(y))
+        ]
+
+    changes = []
+    old_iter, new_iter = iter(old), iter(new)
+    a, b = next(old_iter, None), next(new_iter, None)
+    last_a = last_b = -1
+    while a is not None or b is not None:
+        if a is not None and b is not None and a[0] == b[0]:
+            if a != b:
+                field_deltas = deltas(a, b)
+                if field_deltas:
+                    changes.append(MemberChange(id=b[0], kind='changed', full_description=b[i_description],
+                                                deltas=field_deltas))
+            last_a, last_b = a[0], b[0]
+            a, b = next(old_iter, None), next(new_iter, None)
+        elif b is None or (a is not None and a[0] < b[0]):
+            changes.append(MemberChange(id=a[0], kind='removed', full_description=a[i_description]))
+            last_a = a[0]
+            a = next(old_iter, None)
+        else:
+            changes.append(MemberChange(id=b[0], kind='added', full_description=b[i_description]))
+            last_b = b[0]
+            b = next(new_iter, None)
+
+        if (a is not None and a[0] <= last_a) or (b is not None and b[0] <= last_b):
+            raise ValueError('Snapshots must be sorted by id without duplicates')
+
+    return ChangeSet(registry=registry, created_at=datetime.now(), changes=changes)
+
+
+def diff_rows(
+        old: Iterable[BaseRow],
+        new: Iterable[BaseRow],
+        row_model: Type[BaseRow],
+        registry: str = '',
+        ignore: Iterable[str] = ()
+) -> ChangeSet:
+    return diff_values(row_values(old, row_model), row_values(new, row_model), row_model, registry, ignore)
+
+
+def _to_pylist(column: pa.Array) -> list:
+    # to_pylist of a dictionary array converts every value again, its few values are converted once instead
+    if pa.types.is_dictionary(column.type):
+        values = column.dictionary.to_pylist() + [None]
+        return [values[i] for i in column.indices.fill_null(len(values) - 1).to_pylist()]
+    return column.to_pylist()
+
+
+def iter_parquet_values(filepath: Path, batch_size: int = 10_000) -> Iterator[tuple]:
+    # columns of a snapshot are the fields of its row model in order, no rows are built
+    for batch in pq.ParquetFile(filepath).iter_batches(batch_size=batch_size):
+        yield from zip(*map(_to_pylist, batch.columns))
+
+
+def _written_to(exporter: ParquetExporter, values: Iterable[tuple], batch_size: int = 10_000) -> Iterator[tuple]:
+    batch = []
+    for v in values:
+        batch.append(v)
+        if len(batch) >= batch_size:
+            exporter.write_values(batch)
+            batch = []
+        yield v
+    exporter.write_values(batch)
+
+
+def update_snapshot(
+        db_filepath: Path,
+        registry: str,
+        row_model: Type[BaseRow],
+        dirpath: Path = DIR_SNAPSHOTS,
+        ignore: Iterable[str] = ('last_updated_at',)
+) -> ChangeSet | None:
+    """
+    Writes the current rows of the store to `<registry>.parquet` and diffs them against
+    the snapshot of the previous call on the way, None on the first call. Opens its own
+    connection to the store, so it may run in a thread.
+    """
+    dirpath.mkdir(parents=True, exist_ok=True)
+    filepath = dirpath / f'{registry}.parquet'
+    tmp_filepath = filepath.with_suffix('.parquet.tmp')
+    getter = itemgetter(*row_model.model_fields)
+
+    with MemberStore(db_filepath) as store, ParquetExporter(tmp_filepath, registry, row_model) as exporter:
+        values = _written_to(exporter, map(getter, store.iter_data(registry)))
+        if filepath.exists():
+            changes = diff_values(iter_parquet_values(filepath), values, row_model, registry, ignore)
+        else:
+            for _ in values:
+                pass
+            changes = None
+    # the previous snapshot is replaced only by a complete one
+    os.replace(tmp_filepath, filepath)
+    return changes
@@ -0,0 +1,22 @@
+class RegistryError(Exception):
+    pass
+
+
+class RequestTimeoutError(RegistryError):
+    pass
+
+
+class ConnectionFailedError(RegistryError):
+    pass
+
+
+class RateLimitedError(RegistryError):
+    pass
+
+
+class ServerError(RegistryError):
+    pass
+
+
+class BadResponseError(RegistryError):
+    """Response is not the expected JSON, usually a ban or captcha page"""
@@ -0,0 +1,190 @@
+import csv
+import logging
+import time
+from pathlib import Path
+from operator import attrgetter
+from typing import Iterable, Self, Type
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from src.metrics import XLSX_SECONDS, PARQUET_SECONDS, ROWS
+from src.schemas import BaseRow
+
+
+class XlsxExporter:
+    """
+    Streams rows into a write-only workbook: rows go straight to a temporary file,
+    so memory stays flat and the workbook is written to `filepath` once on close,
+    also when the export fails, like the csv and parquet files.
+    """
+
+    def __init__(self, filepath: Path, registry: str):
+        self.filepath = filepath
+        self.registry = registry
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet()
+        self.rows_written = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def write(self, rows: Iterable[BaseRow]) -> None:
+        rows_written = self.rows_written
+        with XLSX_SECONDS.time(operation='write'):
+            for row in rows:
+                d = row.dict(by_alias=True)
+                if self.rows_written == 0:
+                    self.ws.append(list(d.keys()))
+                self.ws.append(list(d.values()))
+                self.rows_written += 1
+        ROWS.inc(self.rows_written - rows_written, registry=self.registry, stage='xlsx')
+
+    def close(self) -> None:
+        # a write-only workbook can be saved once, so it is saved next to `filepath` and moved
+        # over it, which is retried while the file is open in Excel
+        tmp_filepath = self.filepath.with_name(f'{self.filepath.name}.tmp')
+        with XLSX_SECONDS.time(operation='save'):
+            self.wb.save(tmp_filepath)
+        i = 0
+        while True:
+            try:
+                tmp_filepath.replace(self.filepath)
+                logging.info(f'{self.filepath} was written: {self.rows_written} rows')
+                break
+            except PermissionError as ex:
+                logging.info('Please close the file')
+                i += 1
+                time.sleep(10)
+                if i == 500:
+                    raise ex
+
+
+class CsvExporter:
+    """Streams rows into a csv file with the same header as the Excel export, `;` and BOM so Excel opens it as is"""
+
+    def __init__(self, filepath: Path, registry: str, delimiter: str = ';', encoding: str = 'utf-8-sig'):
+        self.filepath = filepath
+        self.registry = registry
+        self._f = open(filepath, 'w', newline='', encoding=encoding)
+        self._writer = csv.writer(self._f, delimiter=delimiter)
+        self._getters: dict[type, attrgetter] = {}
+        self.rows_written = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _getter(self, row_model: Type[BaseRow]) -> attrgetter:
+        # field values in the order of the header, without building a dict per row
+        if row_model not in self._getters:
+            self._getters[row_model] = attrgetter(*row_model.model_fields)
+        return self._getters[row_model]
+
+    def write(self, rows: Iterable[BaseRow]) -> None:
+        rows_written = self.rows_written
+        for row in rows:
+            if self.rows_written == 0:
+                self._writer.writerow(field.alias or name for name, field in type(row).model_fields.items())
+            self._writer.writerow(self._getter(type(row))(row))
+            self.rows_written += 1
+        ROWS.inc(self.rows_written - rows_written, registry=self.registry, stage='csv')
+
+    def close(self) -> None:
+        self._f.close()
+        logging.info(f'{self.filepath} was written: {self.rows_written} rows')
+
+
+ARROW_TYPES = {
+    int: pa.int64(),
+    str | None: pa.string(),
+    int | str | None: pa.string(),  # ИНН and ОГРН come as numbers or strings, leading zeros must survive
+    float | None: pa.float64(),
+    bool | None: pa.bool_(),
+}
+# few distinct values over the whole registry, stored once per row group instead of once per row
+DICTIONARY_FIELDS = ('sro', 'region', 'member_type', 'member_status', 'accordance_status', 'right_status')
+
+
+def arrow_schema(row_model: Type[BaseRow]) -> pa.Schema:
+    fields = []
+    for name, field in row_model.model_fields.items():
+        if field.annotation not in ARROW_TYPES:
+            raise TypeError(f'No arrow type for {row_model.__name__}.{name}: {field.annotation}')
+        type_ = ARROW_TYPES[field.annotation]
+        if name in DICTIONARY_FIELDS:
+            type_ = pa.dictionary(pa.int32(), type_)
+        # column names are the field names, the Russian header is kept in the field metadata
+        fields.append(pa.field(name, type_, nullable=name != 'id', metadata={'alias': field.alias or name}))
+    return pa.schema(fields)
+
+
+class ParquetExporter:
+    """
+    Streams rows into a typed parquet file: rows are buffered by column and written
+    as one row group every `row_group_size` rows, so memory holds one row group at most.
+    """
+
+    def __init__(self, filepath: Path, registry: str, row_model: Type[BaseRow], row_group_size: int = 100_000,
+                 compression: str = 'zstd'):
+        self.filepath = filepath
+        self.registry = registry
+        self.row_model = row_model
+        self.row_group_size = row_group_size
+        self.schema = arrow_schema(row_model)
+        self.writer = pq.ParquetWriter(
+            filepath,
+            self.schema,
+            compression=compression,
+            use_dictionary=[name for name in row_model.model_fields if name in DICTIONARY_FIELDS],
+        )
+        self._names = list(row_model.model_fields)
+        self._getter = attrgetter(*self._names)
+        self._to_str = [i for i, field in enumerate(row_model.model_fields.values())
+                        if field.annotation == int | str | None]
+        self._buffer: list[tuple] = []
+        self.rows_written = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def write(self, rows: Iterable[BaseRow]) -> None:
+        self.write_values(map(self._getter, rows))
+
+    def write_values(self, values: Iterable[tuple]) -> None:
+        # tuples of field values in the order of the row model
+        rows_written = self.rows_written
+        for v in values:
+            self._buffer.append(v)
+            self.rows_written += 1
+            if len(self._buffer) >= self.row_group_size:
+                self._flush()
+        ROWS.inc(self.rows_written - rows_written, registry=self.registry, stage='parquet')
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        with PARQUET_SECONDS.time(operation='write'):
+            columns = [list(column) for column in zip(*self._buffer)]
+            for i in self._to_str:
+                columns[i] = [None if v is None else str(v) for v in columns[i]]
+            table = pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+                schema=self.schema
+            )
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        self._buffer = []
+
+    def close(self) -> None:
+        self._flush()
+        self.writer.close()
+        logging.info(f'{self.filepath} was written: {self.rows_written} rows')
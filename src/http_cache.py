@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Self
+
+import zstandard
+
+from config import FILEPATH_HTTP_CACHE, HTTP_CACHE_TTL, HTTP_CACHE_MAX_BYTES
+from src.metrics import HTTP_CACHE_REQUESTS, HTTP_CACHE_BYTES
+
+
+class CacheEntry:
+    __slots__ = ('key', 'body', 'etag', 'last_modified', 'content_hash', 'fetched_at')
+
+    def __init__(self, key: str, body: bytes, etag: str | None, last_modified: str | None,
+                 content_hash: str, fetched_at: float):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.fetched_at = fetched_at
+
+    def validators(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Disk cache of registry responses in sqlite, zstd compressed. An entry younger than `ttl`
+    is served without a request; an older one is revalidated with its ETag / Last-Modified
+    when the registry sent them, otherwise it is fetched again and only the content hash is
+    compared, so an unchanged body just gets a new `fetched_at`.
+    Entries accessed least recently are evicted when the bodies exceed `max_bytes`.
+    The scrapers call get, put and refresh in a worker thread, the connection is shared
+    under a lock.
+    """
+    compression_level: int = 3
+    touch_batch_size: int = 1000
+
+    def __init__(self, filepath: Path | str = FILEPATH_HTTP_CACHE, ttl: float = HTTP_CACHE_TTL,
+                 max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.filepath = filepath
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._touched: dict[str, float] = {}
+        self._compressor = zstandard.ZstdCompressor(level=self.compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=30000')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched()
+            self.conn.close()
+        if self.stats:
+            logging.info(f'HTTP cache {self.filepath}: {self.format_stats()}')
+
+    @staticmethod
+    def key(method: str, url: str, body: Any = None) -> str:
+        key = f'{method.upper()} {url}'
+        if body is not None:
+            key += ' ' + json.dumps(body, sort_keys=True, ensure_ascii=False)
+        return key
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.fetched_at < self.ttl
+
+    def get(self, key: str) -> CacheEntry | None:
+        # zstd contexts are not thread safe either, they are used under the lock too
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT body, etag, last_modified, content_hash, fetched_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            body, etag, last_modified, content_hash, fetched_at = row
+            body = self._decompressor.decompress(body)
+        return CacheEntry(key, body, etag, last_modified, content_hash, fetched_at)
+
+    def record(self, result: str, size: int = 0) -> None:
+        # hit - served without a request, revalidated - 304, unchanged - same content hash,
+        # miss - no entry or a changed body
+        self.stats[result] += 1
+        HTTP_CACHE_REQUESTS.inc(result=result)
+        if result in ('hit', 'revalidated'):
+            self.stats['bytes_saved'] += size
+            HTTP_CACHE_BYTES.inc(size)
+
+    def touch(self, entry: CacheEntry) -> None:
+        # access times are written in batches, hits don't cost a commit each
+        with self._lock:
+            self._touched[entry.key] = time.time()
+            if len(self._touched) >= self.touch_batch_size:
+                self._flush_touched()
+
+    def refresh(self, entry: CacheEntry, etag: str | None = None, last_modified: str | None = None) -> None:
+        # the body is still valid: the entry is fresh again, with the validators of the last response
+        now = time.time()
+        entry.fetched_at = now
+        entry.etag = etag or entry.etag
+        entry.last_modified = last_modified or entry.last_modified
+        with self._lock, self.conn:
+            self.conn.execute(
+                'UPDATE responses SET etag = ?, last_modified = ?, fetched_at = ?, accessed_at = ? WHERE key = ?',
+                (entry.etag, entry.last_modified, now, now, entry.key)
+            )
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            with self.conn:
+                self.conn.executemany('UPDATE responses SET accessed_at = ? WHERE key = ?',
+                                      [(t, key) for key, t in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key: str, body: bytes, etag: str | None = None, last_modified: str | None = None,
+            entry: CacheEntry | None = None) -> str:
+        content_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if entry is not None and entry.content_hash == content_hash:
+            self.refresh(entry, etag, last_modified)
+            return 'unchanged'
+
+        now = time.time()
+        with self._lock:
+            compressed = self._compressor.compress(body)
+            with self.conn:
+                row = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+                self.conn.execute(
+                    '''
+                    INSERT OR REPLACE INTO responses
+                        (key, body, size, etag, last_modified, content_hash, fetched_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    (key, compressed, len(compressed), etag, last_modified, content_hash, now, now)
+                )
+            self.size += len(compressed) - (row[0] if row else 0)
+            if self.size > self.max_bytes:
+                self._evict()
+        return 'miss'
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict()
+
+    def _evict(self) -> None:
+        # down to 90% of `max_bytes`, so eviction doesn't run on every put
+        self._flush_touched()
+        target = self.max_bytes * 0.9
+        with self.conn:
+            cursor = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed_at')
+            keys = []
+            for key, size in cursor:
+                if self.size <= target:
+                    break
+                keys.append((key,))
+                self.size -= size
+            self.conn.executemany('DELETE FROM responses WHERE key = ?', keys)
+            evicted = len(keys)
+        self.stats['evicted'] += evicted
+        logging.info(f'HTTP cache: evicted {evicted} entries, {self.size / 2 ** 20:.0f} MB left')
+
+    def format_stats(self) -> str:
+        requests = sum(self.stats[k] for k in ('hit', 'revalidated', 'unchanged', 'miss'))
+        served = self.stats['hit'] + self.stats['revalidated']
+        return (f"hits: {self.stats['hit']}, revalidated: {self.stats['revalidated']}, "
+                f"unchanged: {self.stats['unchanged']}, misses: {self.stats['miss']}, "
+                f"hit ratio: {served / requests if requests else 0:.1%}, "
+                f"saved: {self.stats['bytes_saved'] / 2 ** 20:.1f} MB, evicted: {self.stats['evicted']}")
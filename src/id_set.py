@@ -0,0 +1,44 @@
+from typing import Iterable, Iterator
+
+
+class IdSet:
+    """Set of member ids as a bitmap, 1 bit per possible id; iterates in ascending order"""
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._bits = bytearray()
+        self._len = 0
+        self.update(ids)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, id_: int) -> bool:
+        i = id_ >> 3
+        return i < len(self._bits) and bool(self._bits[i] & (1 << (id_ & 7)))
+
+    def __iter__(self) -> Iterator[int]:
+        for i, byte in enumerate(self._bits):
+            if byte:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        yield i << 3 | bit
+
+    def add(self, id_: int) -> None:
+        i = id_ >> 3
+        if i >= len(self._bits):
+            self._bits.extend(bytes(max(i + 1 - len(self._bits), len(self._bits))))
+        mask = 1 << (id_ & 7)
+        if not self._bits[i] & mask:
+            self._bits[i] |= mask
+            self._len += 1
+
+    def update(self, ids: Iterable[int]) -> None:
+        for id_ in ids:
+            self.add(id_)
+
+    def discard(self, id_: int) -> None:
+        i = id_ >> 3
+        mask = 1 << (id_ & 7)
+        if i < len(self._bits) and self._bits[i] & mask:
+            self._bits[i] &= ~mask
+            self._len -= 1
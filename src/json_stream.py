@@ -0,0 +1,103 @@
+import codecs
+import json
+from typing import Any, AsyncIterator
+
+WHITESPACE = ' \t\n\r'
+NUMBER_CHARS = '0123456789.eE+-'
+DECODER = json.JSONDecoder()
+
+
+class JsonStream:
+    """
+    Pull parser over the chunks of a JSON object: items of the array at `path` are decoded
+    one by one as the chunks arrive, every other value is decoded whole into `rest`.
+    """
+    compact_size: int = 1 << 16
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self.chunks = chunks
+        self.bytes_read = 0
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    async def _more(self) -> None:
+        if self._eof:
+            raise ValueError(f'Unexpected end of JSON at {self.bytes_read} bytes')
+        chunk = await anext(self.chunks, b'')
+        self.bytes_read += len(chunk)
+        self._eof = not chunk
+        # consumed text is dropped once in a while, so the buffer holds about one item
+        if self._pos > self.compact_size:
+            self._buf, self._pos = self._buf[self._pos:], 0
+        self._buf += self._decoder.decode(chunk, final=self._eof)
+
+    async def _peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            await self._more()
+
+    async def _expect(self, chars: str) -> str:
+        c = await self._peek()
+        if c not in chars:
+            raise ValueError(f'Expected one of {chars!r}, got {c!r} at {self.bytes_read} bytes')
+        self._pos += 1
+        return c
+
+    async def _value(self) -> Any:
+        await self._peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                await self._more()
+                continue
+            # a number at the end of the buffer may go on in the next chunk
+            if (not self._eof and type(value) in (int, float)
+                    and (end == len(self._buf) or self._buf[end] in NUMBER_CHARS)):
+                await self._more()
+                continue
+            self._pos = end
+            return value
+
+    async def iter_array(self, path: tuple[str, ...], rest: dict) -> AsyncIterator[Any]:
+        await self._expect('{')
+        async for item in self._object(path, rest):
+            yield item
+
+    async def _object(self, path: tuple[str, ...], out: dict) -> AsyncIterator[Any]:
+        if await self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = await self._value()
+            await self._expect(':')
+            c = await self._peek()
+            if key == path[0] and len(path) == 1 and c == '[':
+                self._pos += 1
+                async for item in self._array():
+                    yield item
+            elif key == path[0] and len(path) > 1 and c == '{':
+                self._pos += 1
+                out[key] = {}
+                async for item in self._object(path[1:], out[key]):
+                    yield item
+            else:
+                out[key] = await self._value()
+            if await self._expect(',}') == '}':
+                return
+
+    async def _array(self) -> AsyncIterator[Any]:
+        if await self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield await self._value()
+            if await self._expect(',]') == ']':
+                return
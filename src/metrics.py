@@ -0,0 +1,215 @@
+import bisect
+import logging
+import re
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    kind: str
+
+    def __init__(self, name: str, help_: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _format_labels(self, key: tuple[str, ...], **extra: str) -> str:
+        pairs = [*zip(self.labels, key), *extra.items()]
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{escape_label(v)}"' for k, v in pairs) + '}'
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for key, value in self.values.items():
+            lines.append(f'{self.name}{self._format_labels(key)} {value}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = buckets
+        # label values -> [count per bucket (the last one is +Inf), sum, count]
+        self.series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0., 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def quantile(self, q: float, counts: list[int]) -> float | None:
+        # upper bound of the bucket the quantile falls into
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip((*self.buckets, float('inf')), counts):
+            seen += count
+            if seen >= q * total:
+                return bound
+        return float('inf')
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for key, (counts, sum_, count) in self.series.items():
+            cumulative = 0
+            for bound, c in zip((*self.buckets, '+Inf'), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{self._format_labels(key, le=str(bound))} {cumulative}')
+            lines.append(f'{self.name}_sum{self._format_labels(key)} {sum_}')
+            lines.append(f'{self.name}_count{self._format_labels(key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.started_at = time.monotonic()
+
+    def _add(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help_, labels))
+
+    def gauge(self, name: str, help_: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(name, help_, labels))
+
+    def histogram(self, name: str, help_: str, labels: tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self._add(Histogram(name, help_, labels, **kwargs))
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics.values() for line in metric.render()) + '\n'
+
+    def snapshot(self) -> tuple[float, dict[str, dict]]:
+        # copy of every series, so summary() can report the difference made by one run
+        data = {}
+        for name, metric in self.metrics.items():
+            if isinstance(metric, Histogram):
+                data[name] = {key: (list(counts), sum_, count) for key, (counts, sum_, count) in metric.series.items()}
+            else:
+                data[name] = dict(metric.values)
+        return time.monotonic(), data
+
+    def summary(self, since: tuple[float, dict[str, dict]] | None = None) -> str:
+        started_at, before = since or (self.started_at, {})
+        elapsed = max(time.monotonic() - started_at, 0.001)
+        lines = [f'Metrics over {elapsed:.0f}s:']
+        for name, metric in self.metrics.items():
+            prev = before.get(name, {})
+            if isinstance(metric, Histogram):
+                for key, (counts, sum_, count) in sorted(metric.series.items()):
+                    prev_counts, prev_sum, prev_count = prev.get(key, ([0] * len(counts), 0., 0))
+                    if count == prev_count:
+                        continue
+                    counts = [c - p for c, p in zip(counts, prev_counts)]
+                    count -= prev_count
+                    lines.append(f'  {name}{metric._format_labels(key)}: {count} observations, '
+                                 f'mean {(sum_ - prev_sum) / count:.4f}s, p50 <= {metric.quantile(0.5, counts)}s, '
+                                 f'p99 <= {metric.quantile(0.99, counts)}s')
+            elif isinstance(metric, Counter):
+                for key, value in sorted(metric.values.items()):
+                    value -= prev.get(key, 0)
+                    if value:
+                        lines.append(f'  {name}{metric._format_labels(key)}: {value:,.0f} ({value / elapsed:,.1f}/s)')
+            else:
+                for key, value in sorted(metric.values.items()):
+                    lines.append(f'  {name}{metric._format_labels(key)}: {value:g}')
+        return '\n'.join(lines)
+
+
+def endpoint_of(path: str) -> str:
+    # /api/member/123/info -> /api/member/{id}/info, so ids don't blow up the label values
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'registry_request_seconds', 'Latency of registry API requests',
+    ('registry', 'endpoint', 'proxy', 'outcome'))
+RESPONSE_BYTES = REGISTRY.counter(
+    'registry_response_bytes_total', 'Bytes of registry API response bodies', ('registry', 'endpoint'))
+RETRIES = REGISTRY.counter('registry_retries_total', 'Retried registry API requests', ('registry',))
+IP_CHANGES = REGISTRY.counter('proxy_ip_changes_total', 'Exit IP rotations', ('proxy', 'outcome'))
+PARSE_SECONDS = REGISTRY.histogram(
+    'registry_parse_seconds', 'Time of mapping one /info response to a row', ('registry',),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+ROWS = REGISTRY.counter('rows_total', 'Rows collected from the registries and written to sinks', ('registry', 'stage'))
+QUEUE_DEPTH = REGISTRY.gauge('collect_queue_depth', 'Parsed rows waiting for the consumer', ('registry',))
+CONCURRENCY_LIMIT = REGISTRY.gauge('registry_concurrency_limit', 'Adaptive concurrency limit', ('registry',))
+IN_FLIGHT = REGISTRY.gauge('registry_requests_in_flight', 'Registry API requests in flight', ('registry',))
+PIPELINE_QUEUE_DEPTH = REGISTRY.gauge(
+    'pipeline_queue_depth', 'Items waiting between the stages of a crawl pipeline', ('registry', 'queue'))
+HTTP_CACHE_REQUESTS = REGISTRY.counter('http_cache_requests_total', 'Cacheable requests by cache result', ('result',))
+HTTP_CACHE_BYTES = REGISTRY.counter('http_cache_saved_bytes_total', 'Response bytes served from the HTTP cache')
+JOB_SECONDS = REGISTRY.histogram(
+    'scheduler_job_seconds', 'Duration of scheduled crawls', ('job', 'outcome'),
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200))
+JOB_START_LAG = REGISTRY.gauge('scheduler_job_start_lag_seconds', 'Delay of the last job start after its slot', ('job',))
+JOB_SKIPPED = REGISTRY.counter('scheduler_jobs_skipped_total', 'Runs skipped as missed or still running', ('job', 'reason'))
+DATA_LAG = REGISTRY.gauge(
+    'registry_data_lag_seconds', 'Age of the high-water mark at the start of a scheduled crawl', ('registry',))
+SHEETS_SECONDS = REGISTRY.histogram(
+    'sheets_call_seconds', 'Google Sheets calls including the rate limiter wait', ('operation',))
+SHEETS_ERRORS = REGISTRY.counter('sheets_errors_total', 'Retried Google Sheets calls', ('reason',))
+XLSX_SECONDS = REGISTRY.histogram('xlsx_write_seconds', 'Time of XLSX writes and saves', ('operation',))
+PARQUET_SECONDS = REGISTRY.histogram('parquet_write_seconds', 'Time of parquet row group writes', ('operation',))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def start_metrics_server(port: int, host: str = '127.0.0.1') -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f'Metrics are served on http://{host}:{port}/metrics')
+    return runner
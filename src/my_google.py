@@ -1,13 +1,26 @@
+import asyncio
+import json
 import logging
-from typing import Self, Type
+import random
+import time
+from typing import Iterator, Self, Type
 from types import TracebackType
 
 import gspread_asyncio as ga
+from gspread import WorksheetNotFound
 from google.oauth2.service_account import Credentials
+from gspread.utils import rowcol_to_a1
 
 from config import FILEPATH_SERVICE_ACCOUNT
+from src.metrics import SHEETS_SECONDS, SHEETS_ERRORS, ROWS
+from src.rate_limit import RateLimiter
 from src.schemas import NostroyRow, NoprizRow
 
+SHEETS_REQUESTS_PER_MINUTE = 55  # per user quota is 60, leave some room for other clients
+MAX_CHUNK_ROWS = 5000
+MAX_CHUNK_BYTES = 2 * 1024 * 1024  # recommended maximum payload of one request
+GRID_ROWS_HEADROOM = 1000
+
 
 def get_creds():
     creds = Credentials.from_service_account_file(FILEPATH_SERVICE_ACCOUNT)
@@ -19,7 +32,54 @@ def get_creds():
     return scoped
 
 
-agcm = ga.AsyncioGspreadClientManager(get_creds)
+def chunk_rows(rows: list[list], max_rows: int = MAX_CHUNK_ROWS, max_bytes: int = MAX_CHUNK_BYTES) -> Iterator[list[list]]:
+    chunk, size = [], 0
+    for row in rows:
+        row_size = len(json.dumps(row, default=str))
+        if chunk and (len(chunk) >= max_rows or size + row_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+
+class RateLimitedClientManager(ga.AsyncioGspreadClientManager):
+    # gspread_asyncio serializes calls and retries 429/5xx forever with a fixed delay;
+    # calls are spaced by a token bucket instead and failures back off exponentially
+    def __init__(self, credentials_fn, requests_per_minute: int = SHEETS_REQUESTS_PER_MINUTE,
+                 max_backoff: float = 64, **kwargs):
+        super().__init__(credentials_fn, **kwargs)
+        self.rate_limiter = RateLimiter(requests_per_minute / 60, burst=max(1, requests_per_minute // 10))
+        self.max_backoff = max_backoff
+        self._errors = 0
+        self._last_error_at = 0.
+
+    async def delay(self):
+        await self.rate_limiter.acquire()
+
+    async def _backoff(self, reason: str, method) -> None:
+        now = time.monotonic()
+        if now - self._last_error_at > self.max_backoff * 2:
+            self._errors = 0
+        self._errors += 1
+        self._last_error_at = now
+
+        delay = min(self.max_backoff, 2 ** self._errors) + random.random()
+        logging.warning(f'Sheets {method.__name__} failed with {reason}, retry in {delay:.1f}s')
+        await asyncio.sleep(delay)
+
+    async def handle_gspread_error(self, e, method, args, kwargs):
+        SHEETS_ERRORS.inc(reason=str(e.response.status_code))
+        await self._backoff(f'HTTP {e.response.status_code}', method)
+
+    async def handle_requests_error(self, e, method, args, kwargs):
+        SHEETS_ERRORS.inc(reason=type(e).__name__)
+        await self._backoff(repr(e), method)
+
+
+agcm = RateLimitedClientManager(get_creds)
 
 
 class GoogleSheets:
@@ -29,6 +89,8 @@ class GoogleSheets:
         self.worksheets: list[ga.AsyncioGspreadWorksheet] | None = None
         self.worksheet: ga.AsyncioGspreadWorksheet | None = None
         self.worksheet_data: list[dict] | None = None
+        self.ids_index: dict[int, int] | None = None  # member id -> sheet row number of the current worksheet
+        self.last_row: int = 0
 
     async def __aenter__(self) -> Self:
         self.agc = await agcm.authorize()
@@ -59,25 +121,91 @@ class GoogleSheets:
             self.worksheets.append(self.worksheet)
         else:
             self.worksheet = await self.spreadsheet.get_worksheet(sheet_index)
+        self.ids_index = None
+
+    async def get_or_add_worksheet_by_title(self, title: str) -> None:
+        # a sheet added by the scraper is found by its title, its index changes when sheets are added by hand
+        try:
+            self.worksheet = await self.spreadsheet.worksheet(title)
+        except WorksheetNotFound:
+            self.worksheet = await self.spreadsheet.add_worksheet(title=title, rows=1000, cols=50)
+            self.worksheets.append(self.worksheet)
+        self.ids_index = None
+
+    async def reserve(self, rows: int, cols: int) -> None:
+        # grow the grid once up front instead of letting every append extend it
+        if rows > self.worksheet.row_count or cols > self.worksheet.col_count:
+            with SHEETS_SECONDS.time(operation='resize'):
+                await self.worksheet.resize(
+                    rows=max(rows + GRID_ROWS_HEADROOM, self.worksheet.row_count),
+                    cols=max(cols, self.worksheet.col_count)
+                )
 
     async def append(self, data: list[dict], append_columns: bool = False) -> None:
         self.agc = await agcm.authorize()
-
-        if append_columns:
-            columns = list(data[0].keys())
-            await self.worksheet.append_row(columns)
+        await self.get_ids_index()
 
         rows = [list(d.values()) for d in data]
-        await self.worksheet.append_rows(rows, value_input_option='RAW')
+        if append_columns:
+            rows.insert(0, list(data[0].keys()))
+        await self.reserve(self.last_row + len(rows), len(rows[0]))
+
+        for chunk in chunk_rows(rows):
+            with SHEETS_SECONDS.time(operation='append_rows'):
+                await self.worksheet.append_rows(chunk, value_input_option='RAW')
+            self.last_row += len(chunk)
+            logging.info(f'Appended {len(chunk)} rows to {self.worksheet.title}, last row: {self.last_row}')
+
+    async def get_ids_index(self) -> dict[int, int]:
+        # only the header and the id column are downloaded, not the whole worksheet
+        if self.ids_index is None:
+            with SHEETS_SECONDS.time(operation='row_values'):
+                header = await self.worksheet.row_values(1)
+            self.ids_index = {}
+            self.last_row = 1 if header else 0
+            if 'id' in header:
+                with SHEETS_SECONDS.time(operation='col_values'):
+                    values = await self.worksheet.col_values(header.index('id') + 1, value_render_option='FORMULA')
+                self.ids_index = {int(v): i for i, v in enumerate(values[1:], start=2) if v not in (None, '')}
+                self.last_row = len(values)
+        return self.ids_index
+
+    async def update_rows(self, data: dict[int, dict]) -> None:
+        # sheet row number -> row, all rows are sent in one batch request;
+        # the API skips nulls, a field that became None is cleared with ''
+        self.agc = await agcm.authorize()
+        with SHEETS_SECONDS.time(operation='batch_update'):
+            await self.worksheet.batch_update(
+                [
+                    {
+                        'range': f'{rowcol_to_a1(row_number, 1)}:{rowcol_to_a1(row_number, len(d))}',
+                        'values': [['' if v is None else v for v in d.values()]]
+                    }
+                    for row_number, d in data.items()
+                ],
+                value_input_option='RAW'
+            )
+        ROWS.inc(len(data), registry=self.worksheet.title, stage='sheets_updated')
 
     async def fill_new_rows(
             self, data: list[NoprizRow | NostroyRow],
-            row_model: Type[NoprizRow] | Type[NostroyRow]
+            row_model: Type[NoprizRow] | Type[NostroyRow],
+            update_existing: bool = False
     ) -> None:
-        ws_data = await self.worksheet.get_all_records(default_blank=None, value_render_option='FORMULA')
-        ws_data_ids = [row_model(**row).id for row in ws_data]
-        new_data = [row.dict(by_alias=True) for row in data if row.id not in ws_data_ids]
+        ids_index = await self.get_ids_index()
+        new_data = [row.dict(by_alias=True) for row in data if row.id not in ids_index]
         logging.info(f'New rows after comparing: {len(new_data)}')
 
+        if update_existing:
+            updated_data = {ids_index[row.id]: row.dict(by_alias=True) for row in data if row.id in ids_index}
+            logging.info(f'Rows to update: {len(updated_data)}')
+            if updated_data:
+                await self.update_rows(updated_data)
+
         if new_data:
-            await self.append(new_data, append_columns=ws_data == [])
+            append_columns = self.last_row == 0
+            first_row = self.last_row + 1 + append_columns
+            await self.append(new_data, append_columns=append_columns)
+            ROWS.inc(len(new_data), registry=self.worksheet.title, stage='sheets_appended')
+            for i, d in enumerate(new_data, start=first_row):
+                ids_index[d['id']] = i
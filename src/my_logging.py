@@ -1,19 +1,94 @@
+import atexit
+import json
 import logging
 import sys
+import time
+from collections import defaultdict
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
 
+from config import LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_JSON, LOG_PROGRESS_INTERVAL
 from src.date_utils import TZ_MSC
 
+_listener: QueueListener | None = None
 
-def get_logger(filename):
-    logging.basicConfig(
-        level=logging.INFO,
-        encoding='utf-8',
-        format="[{asctime}]:[{levelname}]:{message}",
-        style='{',
-        handlers=[
-            logging.FileHandler(filename, mode='a'),
-            logging.StreamHandler(sys.stdout),
-        ]
-    )
-    logging.Formatter.converter = lambda *args: datetime.now(tz=TZ_MSC).timetuple()
+
+class MskFormatter(logging.Formatter):
+    # time of the record, not of the formatting, which happens later in the listener thread
+    def converter(self, timestamp: float) -> time.struct_time:
+        return datetime.fromtimestamp(timestamp, tz=TZ_MSC).timetuple()
+
+
+class JsonFormatter(MskFormatter):
+    # one JSON object per line for log shippers; the message already contains the traceback,
+    # QueueHandler formats it in the logging thread
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            'time': datetime.fromtimestamp(record.created, tz=TZ_MSC).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }, ensure_ascii=False)
+
+
+def get_logger(
+        filename,
+        json_lines: bool = LOG_JSON,
+        max_bytes: int = LOG_MAX_BYTES,
+        backup_count: int = LOG_BACKUP_COUNT
+) -> QueueListener:
+    """
+    Records are put on a queue by the logging thread and written to the rotating file and stdout
+    by a listener thread, so the event loop never waits for the disk or the terminal.
+    `max_bytes=0` never rotates, for processes sharing the file of the parent.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = RotatingFileHandler(filename, mode='a', maxBytes=max_bytes, backupCount=backup_count,
+                                       encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter() if json_lines else
+                              MskFormatter('[{asctime}]:[{levelname}]:{message}', style='{'))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(MskFormatter('[{asctime}]:[{levelname}]:{message}', style='{'))
+
+    queue = SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(queue))
+
+    _listener = QueueListener(queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # the records still on the queue are written before the exit
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    # waits for the listener to write out the queue
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class LogThrottle:
+    # at most one progress record per key and `interval` seconds, the calls in between are counted
+    def __init__(self, interval: float = LOG_PROGRESS_INTERVAL):
+        self.interval = interval
+        self._next_at: dict[str, float] = {}
+        self._calls: defaultdict[str, int] = defaultdict(int)
+
+    def __call__(self, key: str = '') -> int:
+        """Number of calls since the last record if one is due now, else 0"""
+        self._calls[key] += 1
+        now = time.monotonic()
+        if now < self._next_at.get(key, 0):
+            return 0
+        self._next_at[key] = now + self.interval
+        return self._calls.pop(key)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Iterable, Type
+
+from config import FILEPATH_DB, PROXIES
+from src.checkpoint import CrawlJournal
+from src.my_logging import get_logger
+from src.pipeline import Pipeline
+from src.proxy import ProxyPool
+from src.scrappers.base import BaseScrapper
+from src.storage import MemberStore
+
+
+def partition(ids: Iterable[int], shards: int) -> list[array]:
+    # interleaved, so every shard gets its share of both the old and the recently registered members
+    ids = ids if isinstance(ids, array) else array('I', ids)
+    return [ids[i::shards] for i in range(shards)]
+
+
+def partition_proxies(proxies: list[dict], shards: int) -> list[list[dict]]:
+    # an exit IP is rotated by one process only: with fewer proxies than processes the other
+    # processes share it without its change_ip_url and go on with the IP of the owner's rotation
+    if len(proxies) >= shards:
+        return [proxies[i::shards] for i in range(shards)]
+    return [[proxies[i % len(proxies)] if i < len(proxies) else {**proxies[i % len(proxies)], 'change_ip_url': None}]
+            for i in range(shards)]
+
+
+def get_shard_journal_filepath(journal_filepath: Path, shard: int, shards: int) -> Path:
+    return journal_filepath.with_name(f'{journal_filepath.stem}.{shard + 1}of{shards}{journal_filepath.suffix}')
+
+
+async def _crawl_shard(
+        scrapper_cls: Type[BaseScrapper],
+        shard: int,
+        ids: array,
+        db_filepath: Path,
+        journal_filepath: Path | None,
+        refetch: bool,
+        scrapper_kwargs: dict
+) -> dict:
+    started_at = time.monotonic()
+    with MemberStore(db_filepath) as store:
+        async with scrapper_cls(store=store, **scrapper_kwargs) as scrapper:
+            if journal_filepath is not None:
+                scrapper.journal = CrawlJournal(journal_filepath)
+                if not scrapper.journal.discovery_finished:
+                    scrapper.journal.record_discovered(ids)
+            collected = await Pipeline(scrapper).run(ids, refetch=refetch)
+    return {
+        'shard': shard,
+        'ids': len(ids),
+        'collected': collected,
+        'retries': scrapper.retries,
+        'seconds': time.monotonic() - started_at,
+    }
+
+
+def crawl_shard(
+        scrapper_cls: Type[BaseScrapper],
+        shard: int,
+        ids: array,
+        db_filepath: Path,
+        journal_filepath: Path | None = None,
+        refetch: bool = False,
+        log_filename: str | None = None,
+        scrapper_kwargs: dict | None = None
+) -> dict:
+    # entry point of a worker process: its own event loop, session, limiter and sqlite connection
+    if log_filename:
+        # the parent rotates the shared file, workers only append to it
+        get_logger(log_filename, max_bytes=0)
+    logging.info(f'[{scrapper_cls.registry}] Shard {shard + 1}: {len(ids)} ids')
+    return asyncio.run(_crawl_shard(scrapper_cls, shard, ids, db_filepath, journal_filepath, refetch,
+                                    scrapper_kwargs or {}))
+
+
+async def crawl_parallel(
+        scrapper_cls: Type[BaseScrapper],
+        ids: Iterable[int],
+        processes: int,
+        db_filepath: Path = FILEPATH_DB,
+        journal_filepath: Path | None = None,
+        refetch: bool = False,
+        log_filename: str | None = None,
+        proxies: list[dict] | None = None,
+        **scrapper_kwargs
+) -> int:
+    """
+    Fetches /info of `ids` in `processes` worker processes, each one crawls its shard of the ids
+    with its own scraper, so JSON decoding and row building use all the cores. Rows are merged
+    in the sqlite store at `db_filepath`, deduplicated by its (registry, id) key.
+    `max_concurrency` and `rate_limit` of `scrapper_kwargs` are the budget of the whole crawl,
+    split evenly between the processes; `proxies` (config.PROXIES by default) are split too.
+    """
+    shards = partition(ids, processes)
+    registry = scrapper_cls.registry
+    # the registry and the proxies see the sum over the processes
+    max_concurrency = scrapper_kwargs.get('max_concurrency') or scrapper_cls.max_concurrency
+    scrapper_kwargs['max_concurrency'] = max(1, max_concurrency // processes)
+    if scrapper_kwargs.get('rate_limit'):
+        scrapper_kwargs['rate_limit'] /= processes
+    shard_proxies = partition_proxies(proxies or PROXIES, processes)
+    started_at = time.monotonic()
+
+    loop = asyncio.get_running_loop()
+    # spawn: a forked worker would inherit the running event loop and open sqlite connections
+    with ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn')) as pool:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                pool, crawl_shard, scrapper_cls, shard, shard_ids, db_filepath,
+                get_shard_journal_filepath(journal_filepath, shard, processes) if journal_filepath else None,
+                refetch, log_filename, {**scrapper_kwargs, 'proxy_pool': ProxyPool.from_config(shard_proxies[shard])}
+            )
+            for shard, shard_ids in enumerate(shards)
+        ], return_exceptions=True)
+
+    collected = 0
+    errors = []
+    for shard, result in enumerate(results):
+        if isinstance(result, BaseException):
+            logging.error(f'[{registry}] Shard {shard + 1} failed', exc_info=result)
+            errors.append(result)
+            continue
+        collected += result['collected']
+        logging.info(f"[{registry}] Shard {shard + 1}: {result['collected']}/{result['ids']} members "
+                     f"in {result['seconds']:.0f}s, retries: {result['retries']}")
+    if errors:
+        raise errors[0]
+
+    elapsed = time.monotonic() - started_at
+    logging.info(f'[{registry}] Done: {collected} members in {elapsed:.0f}s with {processes} processes, '
+                 f'{collected / elapsed:.1f} members/s')
+    return collected
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterable, Iterable, Type
+
+from src.exporters import XlsxExporter, CsvExporter, ParquetExporter
+from src.metrics import ROWS, PIPELINE_QUEUE_DEPTH
+from src.my_google import GoogleSheets
+from src.schemas import BaseRow
+from src.scrappers.base import BaseScrapper
+
+DONE = object()
+
+
+class Sink(ABC):
+    name: str
+    batch_size: int = 1000  # rows per write
+
+    @abstractmethod
+    async def write(self, rows: list[BaseRow]) -> None:
+        raise NotImplementedError
+
+
+class ExporterSink(Sink):
+    def __init__(self, exporter: XlsxExporter | CsvExporter | ParquetExporter, name: str, batch_size: int = 1000):
+        self.exporter = exporter
+        self.name = name
+        self.batch_size = batch_size
+
+    async def write(self, rows: list[BaseRow]) -> None:
+        # exporters are synchronous, the event loop keeps fetching meanwhile
+        await asyncio.to_thread(self.exporter.write, rows)
+
+
+class SheetsSink(Sink):
+    name = 'sheets'
+
+    def __init__(self, gs: GoogleSheets, row_model: Type[BaseRow], update_existing: bool = False,
+                 batch_size: int = 1000):
+        self.gs = gs
+        self.row_model = row_model
+        self.update_existing = update_existing
+        self.batch_size = batch_size
+
+    async def write(self, rows: list[BaseRow]) -> None:
+        await self.gs.fill_new_rows(rows, row_model=self.row_model, update_existing=self.update_existing)
+
+
+class Pipeline:
+    """
+    discovery -> fetch -> parse -> store -> sinks, every stage is a group of tasks connected
+    to the next one by a bounded queue, so a slow stage holds the others back instead of
+    letting rows pile up, and the network never waits for a sink to finish a write.
+    The store, archive and journal of the scrapper are written by the store stage.
+    """
+
+    def __init__(
+            self,
+            scrapper: BaseScrapper,
+            sinks: list[Sink] = (),
+            fetch_concurrency: int | None = None,
+            parse_concurrency: int = 1,
+            queue_size: int = 1000,
+            store_batch_size: int = 50,
+            sink_queue_size: int = 4
+    ):
+        self.scrapper = scrapper
+        self.sinks = list(sinks)
+        self.fetch_concurrency = fetch_concurrency or scrapper.max_concurrency
+        self.parse_concurrency = parse_concurrency
+        self.queue_size = queue_size
+        self.store_batch_size = store_batch_size
+        self.sink_queue_size = sink_queue_size  # batches of `store_batch_size` rows
+        self.collected = 0
+        self.started_at: float | None = None
+        self._failed: list[int] = []
+
+    async def _discover(self, ids: Iterable[int] | AsyncIterable[int], refetch: bool, out: asyncio.Queue) -> None:
+        async for id_ in self.scrapper.pending_ids(ids, refetch):
+            await out.put(id_)
+        for _ in range(self.fetch_concurrency):
+            await out.put(DONE)
+
+    async def _fetch(self, inp: asyncio.Queue, out: asyncio.Queue) -> None:
+        async def worker():
+            while (id_ := await inp.get()) is not DONE:
+                raw = await self.scrapper.fetch_one(id_, self._failed)
+                if raw is not None:
+                    await out.put((id_, raw))
+
+        await asyncio.gather(*[worker() for _ in range(self.fetch_concurrency)])
+        for _ in range(self.parse_concurrency):
+            await out.put(DONE)
+
+    async def _parse(self, inp: asyncio.Queue, out: asyncio.Queue) -> None:
+        async def worker():
+            while (res := await inp.get()) is not DONE:
+                id_, raw = res
+                row = self.scrapper.parse_one(id_, raw, self._failed)
+                if row is not None:
+                    await out.put((row, raw))
+
+        await asyncio.gather(*[worker() for _ in range(self.parse_concurrency)])
+        await out.put(DONE)
+
+    async def _store(self, inp: asyncio.Queue, outs: list[asyncio.Queue], queues: dict[str, asyncio.Queue]) -> None:
+        scrapper = self.scrapper
+        batch = []
+        while True:
+            res = await inp.get()
+            if res is not DONE:
+                batch.append(res)
+                if len(batch) < self.store_batch_size:
+                    continue
+            if batch or self._failed:
+                self.collected += len(batch)
+                ROWS.inc(len(batch), registry=scrapper.registry, stage='collected')
+                rows = scrapper.flush_batch(batch, self._failed)
+                batch = []
+                for out in outs:
+                    await out.put(rows)
+
+                for name, queue in queues.items():
+                    PIPELINE_QUEUE_DEPTH.set(queue.qsize(), registry=scrapper.registry, queue=name)
+                if scrapper.log_throttle('collected') or res is DONE:
+                    rate = self.collected / (time.monotonic() - self.started_at)
+                    logging.info(f'[{scrapper.registry}] Progress: {self.collected} members, {rate:.1f} members/s | '
+                                 f'{scrapper.format_limiter_state()} | '
+                                 f'queues: ' + ', '.join(f'{name} {q.qsize()}' for name, q in queues.items()))
+            if res is DONE:
+                break
+
+        for out in outs:
+            await out.put(DONE)
+
+    async def _sink(self, sink: Sink, inp: asyncio.Queue) -> None:
+        pending = []
+        while (rows := await inp.get()) is not DONE:
+            pending += rows
+            if len(pending) >= sink.batch_size:
+                await sink.write(pending)
+                pending = []
+        if pending:
+            await sink.write(pending)
+
+    async def run(self, ids: Iterable[int] | AsyncIterable[int], refetch: bool = False) -> int:
+        self.started_at = time.monotonic()
+        ids_queue = asyncio.Queue(maxsize=self.queue_size)
+        raw_queue = asyncio.Queue(maxsize=self.queue_size)
+        row_queue = asyncio.Queue(maxsize=self.queue_size)
+        sink_queues = [asyncio.Queue(maxsize=self.sink_queue_size) for _ in self.sinks]
+        queues = {'ids': ids_queue, 'raw': raw_queue, 'rows': row_queue,
+                  **{sink.name: q for sink, q in zip(self.sinks, sink_queues)}}
+
+        tasks = [
+            asyncio.create_task(self._discover(ids, refetch, ids_queue)),
+            asyncio.create_task(self._fetch(ids_queue, raw_queue)),
+            asyncio.create_task(self._parse(raw_queue, row_queue)),
+            asyncio.create_task(self._store(row_queue, sink_queues, queues)),
+            *[asyncio.create_task(self._sink(sink, q)) for sink, q in zip(self.sinks, sink_queues)],
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # the first failed stage fails the run, the other stages would wait forever
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.collected
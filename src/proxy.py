@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import random
+import time
+
+from aiohttp import ClientSession
+from yarl import URL
+
+from src.metrics import IP_CHANGES
+from src.exceptions import (
+    RegistryError,
+    RequestTimeoutError,
+    ConnectionFailedError,
+    RateLimitedError,
+    BadResponseError,
+)
+
+
+class Proxy:
+    ewma_alpha: float = 0.2
+
+    def __init__(self, url: str | None = None, change_ip_url: str | None = None):
+        self.url = url or None  # None - direct connection
+        # host:port for the logs and metric labels, the url may hold the credentials of the proxy
+        self.label = f'{URL(self.url).host}:{URL(self.url).port}' if self.url else 'direct'
+        self.change_ip_url = change_ip_url
+        self.latency: float = 1.
+        self.success_rate: float = 1.
+        self.consecutive_failures: int = 0
+        self.unhealthy_until: float = 0.
+        self.last_rotation: float = 0.
+        self.rotations: int = 0
+        self._rotation: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        return f'Proxy({self.label}, score={self.score:.2f})'
+
+    @property
+    def score(self) -> float:
+        return self.success_rate / max(self.latency, 0.01)
+
+    def report_success(self, latency: float) -> None:
+        self.latency += self.ewma_alpha * (latency - self.latency)
+        self.success_rate += self.ewma_alpha * (1 - self.success_rate)
+        self.consecutive_failures = 0
+
+    def report_failure(self, cooldown: float = 0.) -> None:
+        self.success_rate -= self.ewma_alpha * self.success_rate
+        self.consecutive_failures += 1
+        if cooldown:
+            self.unhealthy_until = max(self.unhealthy_until, time.monotonic() + cooldown)
+
+    def reset(self) -> None:
+        # a new exit IP starts with a clean record
+        self.success_rate = 1.
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.
+
+
+class ProxyPool:
+    rotation_cooldown: float = 30.  # one rotation serves every failure within this window
+    connection_cooldown: float = 60.
+    timeouts_before_rotation: int = 3
+
+    def __init__(self, proxies: list[Proxy]):
+        self.proxies = proxies or [Proxy()]
+
+    @classmethod
+    def from_config(cls, proxies: list[dict]) -> 'ProxyPool':
+        return cls([Proxy(**p) for p in proxies])
+
+    def choose(self) -> Proxy:
+        now = time.monotonic()
+        healthy = [p for p in self.proxies if p.unhealthy_until <= now and (p._rotation is None or p._rotation.done())]
+        if not healthy:
+            return min(self.proxies, key=lambda p: p.unhealthy_until)
+        # weighted by score, so a slow proxy still gets some traffic to recover its score
+        return random.choices(healthy, weights=[p.score for p in healthy])[0]
+
+    async def rotate(self, proxy: Proxy, session: ClientSession) -> None:
+        if proxy.change_ip_url is None:
+            return
+        if proxy._rotation is None or proxy._rotation.done():
+            if time.monotonic() - proxy.last_rotation < self.rotation_cooldown:
+                return
+            proxy.last_rotation = time.monotonic()
+            proxy._rotation = asyncio.create_task(self._change_ip(proxy, session))
+        # every request failed by the old IP waits for the same rotation
+        await asyncio.shield(proxy._rotation)
+
+    @staticmethod
+    async def _change_ip(proxy: Proxy, session: ClientSession) -> None:
+        logging.info(f'Changing IP of {proxy}')
+        try:
+            async with session.request(method='GET', url=proxy.change_ip_url) as resp:
+                if not resp.ok:
+                    logging.error(f'Changing IP of {proxy} failed: {resp.status}')
+                    IP_CHANGES.inc(proxy=proxy.label, outcome='failed')
+                    return
+        except Exception as ex:
+            logging.error(f'Changing IP of {proxy} failed: {ex!r}')
+            IP_CHANGES.inc(proxy=proxy.label, outcome='failed')
+            return
+        IP_CHANGES.inc(proxy=proxy.label, outcome='ok')
+        proxy.rotations += 1
+        proxy.reset()
+
+    async def handle_error(self, proxy: Proxy, ex: RegistryError, session: ClientSession) -> None:
+        if isinstance(ex, (RateLimitedError, BadResponseError)):
+            # the exit IP is throttled or banned
+            proxy.report_failure()
+            await self.rotate(proxy, session)
+        elif isinstance(ex, ConnectionFailedError):
+            # the proxy (or the network) is down, let the other proxies take the load for a while
+            proxy.report_failure(cooldown=self.connection_cooldown)
+        elif isinstance(ex, RequestTimeoutError):
+            proxy.report_failure()
+            if proxy.consecutive_failures >= self.timeouts_before_rotation:
+                await self.rotate(proxy, session)
+        # ServerError is a problem of the registry, not of the proxy
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` acquisitions per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit: grows by `increase` per round trip while latency stays near
+    the best observed one, and is multiplied by `decrease` on throttling, server errors or timeouts.
+    """
+
+    def __init__(self, initial: int = 10, min_limit: int = 1, max_limit: int = 100,
+                 increase: float = 1., decrease: float = 0.5, latency_tolerance: float = 2.,
+                 samples: int = 1000):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.successes = 0
+        self.errors = 0
+        self.min_latency: float | None = None
+        self.latency: float | None = None  # EWMA
+        self._latencies = deque(maxlen=samples)
+        self._last_decrease = 0.
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency: float) -> None:
+        self.successes += 1
+        self._latencies.append(latency)
+        self.latency = latency if self.latency is None else self.latency + 0.1 * (latency - self.latency)
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+
+        if self.latency <= self.min_latency * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+
+    def on_overload(self) -> None:
+        self.errors += 1
+        # requests that were in flight together fail together, back off once per round trip
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 1.):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        logging.info(f'Concurrency limit decreased to {int(self.limit)}')
+
+    def percentile(self, q: float) -> float | None:
+        if not self._latencies:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'successes': self.successes,
+            'errors': self.errors,
+            'latency_ewma': self.latency,
+            'latency_min': self.min_latency,
+            'latency_p50': self.percentile(0.5),
+            'latency_p99': self.percentile(0.99),
+        }
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
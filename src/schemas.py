@@ -1,4 +1,5 @@
-from typing import Any
+from functools import cache
+from typing import Any, Callable, Self
 
 from pydantic import (
     BaseModel,
@@ -8,6 +9,64 @@ from pydantic import (
 )
 
 
+class NeedsValidation(Exception):
+    pass
+
+
+def _coerce_int(v: Any) -> int:
+    if type(v) is int:
+        return v
+    raise NeedsValidation
+
+
+def _coerce_str(v: Any) -> str | None:
+    t = type(v)
+    if v is None or t is str:
+        return v or None
+    elif t is int or t is float:
+        return str(v)
+    raise NeedsValidation
+
+
+def _coerce_int_or_str(v: Any) -> int | str | None:
+    t = type(v)
+    if v is None or t is int:
+        return v
+    elif t is str:
+        return v or None
+    raise NeedsValidation
+
+
+def _coerce_float(v: Any) -> float | None:
+    t = type(v)
+    if v is None or t is float:
+        return v
+    elif t is int:
+        return float(v)
+    raise NeedsValidation
+
+
+def _coerce_bool(v: Any) -> bool | None:
+    if v is None or type(v) is bool:
+        return v
+    raise NeedsValidation
+
+
+def _needs_validation(v: Any) -> Any:
+    raise NeedsValidation
+
+
+# what validation of the annotation does to the values the registries actually send,
+# anything else goes through the full pydantic validation
+COERCERS: dict[Any, Callable[[Any], Any]] = {
+    int: _coerce_int,
+    str | None: _coerce_str,
+    int | str | None: _coerce_int_or_str,
+    float | None: _coerce_float,
+    bool | None: _coerce_bool,
+}
+
+
 class BaseRow(BaseModel):
     model_config = ConfigDict(populate_by_name=True, coerce_numbers_to_str=True)
 
@@ -56,6 +115,24 @@ class BaseRow(BaseModel):
                     d[k] = None
         return d
 
+    @classmethod
+    @cache
+    def _coercers(cls) -> dict[str, Callable[[Any], Any]]:
+        return {
+            name: COERCERS.get(field.annotation, _needs_validation)
+            for name, field in cls.model_fields.items()
+        }
+
+    @classmethod
+    def construct_trusted(cls, **data: Any) -> Self:
+        # same result as cls(**data) for the plain JSON values of the registries,
+        # without running the validators
+        try:
+            values = {name: coerce(data[name]) for name, coerce in cls._coercers().items() if name in data}
+        except NeedsValidation:
+            return cls(**data)
+        return cls.model_construct(**values)
+
 
 class NostroyRow(BaseRow):
     region: str | None = Field(alias='Регион', default=None)
@@ -64,7 +141,7 @@ class NostroyRow(BaseRow):
     is_simple: bool | None = Field(alias='В отношении объектов капитального строительства (кроме особо опасных, технически сложных и уникальных объектов, объектов использования атомной энергии)', default=None)
     is_extremely_dangerous: bool | None = Field(alias='В отношении особо опасных, технически сложных и уникальных объектов капитального строительства (кроме объектов использования атомной энергии)', default=None)
     is_nuclear: bool | None = Field(alias='В отношении объектов использования атомной энергии', default=None)
-    is_odo: bool | None = Field(alias='Сведения об ограничении права принимать участие в заключении договоров строительного подряда, договоров подряда на осуществление сноса объектов капитального строительства с использованием конкурентных способов заключения договоров', default=None)
+    is_odo: str | None = Field(alias='Сведения об ограничении права принимать участие в заключении договоров строительного подряда, договоров подряда на осуществление сноса объектов капитального строительства с использованием конкурентных способов заключения договоров', default=None)
     responsibility_level_odo: str | None = Field(alias='Размер обязательств по договорам подряда с использованием конкурентных способов заключения договоров (уровень ответственности)', default=None)
     responsibility_level_vv: str | None = Field(alias='Стоимость работ по одному договору подряда (уровень ответственности)', default=None)
     compensation_fund_fee_odo: str | None = Field(alias='Размер взноса в компенсационный фонд обеспечения договорных обязательств', default=None)
@@ -2,109 +2,625 @@ import time
 from abc import ABC, abstractmethod
 import logging
 import asyncio
+import itertools
+import hashlib
+import json
+import ssl
 from datetime import datetime
 from pathlib import Path
+from array import array
+from contextlib import aclosing, contextmanager, nullcontext
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, Sized, Type
 
-from aiohttp import ClientSession
-from tenacity import retry, before_sleep_log, wait_random
+from aiohttp import ClientSession, ClientResponse, ClientError
+from tenacity import retry, retry_if_exception_type, before_sleep_log, wait_random, RetryCallState
+from yarl import URL
 
+from src.archive import RawArchive
+from src.checkpoint import CrawlJournal
+from src.http_cache import HttpCache, CacheEntry
+from src.id_set import IdSet
+from src.json_stream import JsonStream
+from src.my_logging import LogThrottle
+from src.date_utils import to_iso, as_msk
+from src.metrics import (
+    REQUEST_SECONDS,
+    RESPONSE_BYTES,
+    RETRIES,
+    PARSE_SECONDS,
+    ROWS,
+    QUEUE_DEPTH,
+    CONCURRENCY_LIMIT,
+    IN_FLIGHT,
+    endpoint_of,
+)
+from src.exceptions import (
+    RegistryError,
+    RequestTimeoutError,
+    ConnectionFailedError,
+    RateLimitedError,
+    ServerError,
+    BadResponseError,
+)
+from src.proxy import ProxyPool, Proxy
+from src.rate_limit import RateLimiter, AIMDLimiter
 from src.schemas import FiltersNostroy, BaseRow
-from config import DATE_FORMAT
+from src.storage import MemberStore
+from src.transport import TransportConfig, create_session
+from config import DATE_FORMAT, DIR_CHECKPOINTS, PROXIES
+
+
+def wait_for_error(retry_state: RetryCallState) -> float:
+    # timeouts and dead proxies are retried soon on another connection,
+    # throttling and server errors need the registry to cool down
+    ex = retry_state.outcome.exception()
+    if isinstance(ex, (RequestTimeoutError, ConnectionFailedError)):
+        return wait_random(0.5, 2)(retry_state)
+    return wait_random(5, 10)(retry_state)
+
+
+def count_retry(retry_state: RetryCallState) -> None:
+    scrapper = retry_state.args[0]
+    scrapper.retries += 1
+    RETRIES.inc(registry=scrapper.registry)
 
 
 class BaseScrapper(ABC):
+    registry: str
+    row_model: Type[BaseRow]
+    base_url: str
     date_format: str = DATE_FORMAT
     last_ip_change: float | None = None
+    max_concurrency: int = 50  # upper bound of the adaptive limit
+    initial_concurrency: int = 10
+    rate_limit: float | None = None  # requests per second per host
+    discovery_concurrency: int = 10  # list pages in flight across all filter shards
+    ids_page_size: int = 1000
+    stream_chunk_size: int = 64 * 1024
+    transport: TransportConfig = TransportConfig()
+    ssl_context: ssl.SSLContext | bool = True  # True - verify with the connector's context
 
     def __init__(self, date_from: datetime, date_to: datetime,
-                 date_format: str | None = None, proxy_url: str | None = None):
+                 date_format: str | None = None, proxy_url: str | None = None,
+                 max_concurrency: int | None = None, rate_limit: float | None = None,
+                 discovery_concurrency: int | None = None, store: MemberStore | None = None,
+                 session: ClientSession | None = None, transport: TransportConfig | None = None,
+                 proxy_pool: ProxyPool | None = None, base_url: str | None = None,
+                 archive: RawArchive | None = None, http_cache: HttpCache | None = None):
         if date_format:
             self.date_format = date_format
+        self.datetime_format = f'{self.date_format} %X'
+        if max_concurrency:
+            self.max_concurrency = max_concurrency
+        if rate_limit:
+            self.rate_limit = rate_limit
+        if discovery_concurrency:
+            self.discovery_concurrency = discovery_concurrency
+        if transport:
+            self.transport = transport
+        if base_url:
+            self.base_url = base_url.rstrip('/')
 
-        self.date_from = date_from
-        self.date_to = date_to
+        # registration dates are compared in Moscow time whatever the timezone of the host
+        self.date_from = as_msk(date_from)
+        self.date_to = as_msk(date_to)
         self.proxy_url = proxy_url
+        if proxy_pool is None:
+            proxy_pool = ProxyPool([Proxy(proxy_url)]) if proxy_url else ProxyPool.from_config(PROXIES)
+        self.proxy_pool = proxy_pool
+        self.store = store
+        self.archive = archive
+        self.http_cache = http_cache
+        self._session = session
+        self._owns_session = session is None
+        self.journal: CrawlJournal | None = None
+        self._rate_limiters: dict[str, RateLimiter] = {}
+        self.retries = 0
+        # per page and per batch records are throttled, they would be thousands per second
+        self.log_throttle = LogThrottle()
+        self.limiter = AIMDLimiter(
+            initial=min(self.initial_concurrency, self.max_concurrency),
+            max_limit=self.max_concurrency
+        )
+        self._discovery_semaphore = asyncio.Semaphore(self.discovery_concurrency)
+
+    @abstractmethod
+    async def _request_ids_page(
+            self,
+            filters: dict,
+            page: int,
+            on_item: Callable[[dict], bool]
+    ) -> tuple[dict, int]:
+        """
+        Streams the items of the member list page into `on_item` until it returns True.
+        Returns `data` of the response without the items ({'count': ..., 'countPages': ...})
+        and the number of items read.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get_registration_date(self, item: dict) -> datetime:
+        raise NotImplementedError
 
     @abstractmethod
-    async def _collect_ids(self, filters: dict) -> list[str]:
+    async def _request_page_info(self, id_: int) -> dict:
+        """Returns `data` of the member info response"""
         raise NotImplementedError
 
     @abstractmethod
-    async def collect_page_info(self, id_: int) -> dict[str, int | str]:
+    def parse_page_info(self, r: dict) -> BaseRow:
         raise NotImplementedError
 
-    async def collect_ids(self, filters: dict) -> list[int]:
-        ids = []
+    async def collect_page_info(self, id_: int) -> BaseRow:
+        raw = await self._request_page_info(id_)
+        with PARSE_SECONDS.time(registry=self.registry):
+            return self.parse_page_info(raw)
+
+    def _is_new_or_updated(self, item: dict, stored: dict[int, str | None]) -> bool:
+        # `last_updated_at` of the member list changes together with member info (status,
+        # suspension, compensation fund...), so only new and changed members need /info
+        updated_at = item.get('last_updated_at')
+        return item['id'] not in stored or (updated_at is not None and to_iso(updated_at) != stored[item['id']])
+
+    async def _read_ids_page(
+            self,
+            filters: dict,
+            page: int,
+            on_item: Callable[[dict], None]
+    ) -> tuple[dict, int, bool]:
+        # returns the rest of the page, the number of items read and whether `date_from` was reached;
+        # pages are sorted from new to old registrations, so the first item older than
+        # `date_from` means this and all following pages are out of the window
+        reached_date_from = False
+
+        def on_page_item(item: dict) -> bool:
+            nonlocal reached_date_from
+            dt = self._get_registration_date(item)
+            if dt < self.date_from:
+                reached_date_from = True
+                return True
+            elif dt <= self.date_to:
+                on_item(item)
+            return False
+
+        async with self._discovery_semaphore:
+            data, count = await self._request_ids_page(filters, page, on_page_item)
+        return data, count, reached_date_from
+
+    def _log_page(self, filters: dict, page: int, count: int, count_pages: int | None = None) -> None:
+        if pages := self.log_throttle('discovery'):
+            logging.info(f'{filters=} | Page №: {page}{f"/{count_pages}" if count_pages else ""} ; '
+                         f'Read items: {count} | {pages} pages since the last record')
+
+    async def _collect_ids(self, filters: dict, on_item: Callable[[dict], None]) -> None:
+        data, count, stop = await self._read_ids_page(filters, 1, on_item)
+        self._log_page(filters, 1, count)
+        if not count or stop:
+            return
 
-        if all([not isinstance(v, (list, tuple)) for v in filters.values()]):
-            ids += await self._collect_ids(filters)
+        count_pages = data.get('countPages')
+        if count_pages is None:
+            page = 1
+            while count >= self.ids_page_size:
+                page += 1
+                data, count, stop = await self._read_ids_page(filters, page, on_item)
+                self._log_page(filters, page, count)
+                if stop:
+                    break
+            return
+
+        pages = iter(range(2, count_pages + 1))
+        stop_page = count_pages
+
+        async def worker():
+            nonlocal stop_page
+            for page in pages:
+                if page > stop_page:
+                    return
+                _, count, stop = await self._read_ids_page(filters, page, on_item)
+                if stop:
+                    stop_page = min(stop_page, page)
+                self._log_page(filters, page, count, count_pages)
+
+        await asyncio.gather(*[worker() for _ in range(self.discovery_concurrency)])
+
+    async def _discover(self, filters: dict, on_item: Callable[[dict], None]) -> None:
+        # every combination of list-valued filters is a separate shard, shards and their
+        # pages share one `discovery_concurrency` budget
+        list_keys = [k for k, v in filters.items() if isinstance(v, (list, tuple))]
+        shards = []
+        for values in itertools.product(*[filters[k] for k in list_keys]):
+            filters_ = filters.copy()
+            filters_.update(zip(list_keys, values))
+            shards.append(filters_)
+
+        logging.info(f'Start collecting ids over {len(shards)} filter shards')
+        await asyncio.gather(*[self._collect_ids(filters_, on_item) for filters_ in shards])
+
+    async def iter_ids(self, filters: dict, updated_only: bool = False) -> AsyncIterator[int]:
+        # ids are yielded while the discovery goes on, so fetching can start right away;
+        # leaving the iteration early cancels the discovery
+        stored = None
+        if updated_only:
+            assert self.store is not None, 'refresh mode requires a store'
+            stored = self.store.get_updated_at(self.registry)
+
+        seen = IdSet()  # shards overlap and retried pages are read again
+        queue = asyncio.Queue()
+        done = object()
+        yielded = 0
+
+        def on_item(item: dict) -> None:
+            if item['id'] in seen:
+                return
+            seen.add(item['id'])
+            if stored is None or self._is_new_or_updated(item, stored):
+                queue.put_nowait(item['id'])
+
+        discovery = asyncio.create_task(self._discover(filters, on_item))
+        discovery.add_done_callback(lambda _: queue.put_nowait(done))
+        try:
+            while (id_ := await queue.get()) is not done:
+                yielded += 1
+                yield id_
+            discovery.result()
+        finally:
+            discovery.cancel()
+            await asyncio.gather(discovery, return_exceptions=True)
+
+        if stored is None:
+            logging.info(f'{len(seen)} ids collected')
         else:
-            for k, v in filters.items():
-                if isinstance(v, (list, tuple)):
-                    for v_ in v:
-                        filters_ = filters.copy()
-                        filters_[k] = v_
-                        logging.info(f'Start using {filters_=}')
-                        ids += await self._collect_ids(filters_)
-        return ids
+            logging.info(f'{yielded} of {len(seen)} members are new or changed since the last fetch')
+
+    async def collect_ids(self, filters: dict) -> array:
+        ids = IdSet()
+        async for id_ in self.iter_ids(filters):
+            ids.add(id_)
+        return array('I', ids)
+
+    async def collect_updated_ids(self, filters: dict) -> array:
+        ids = IdSet()
+        async for id_ in self.iter_ids(filters, updated_only=True):
+            ids.add(id_)
+        return array('I', ids)
+
+    def get_journal_filepath(self, filters: dict) -> Path:
+        name = self.get_filename(self.registry)
+        if filters:
+            name += '_' + hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()[:8]
+        return DIR_CHECKPOINTS / f'{name}.journal'
 
-    async def get_ids(self, filters: FiltersNostroy | None = None) -> list[int]:
+    async def get_ids(self, filters: FiltersNostroy | None = None) -> array:
+        # ids and progress of the crawl are journaled per scraper, date window and filters,
+        # so a restarted crawl skips the discovery and already completed ids
         filters = filters.dict(exclude_none=True) if filters else {}
-        # filepath = Path(f'ids_{self.__class__.__name__}.txt')
-        filepath = Path('not_appended_ids.txt')
-
-        if filepath.exists():
-            with open(filepath, 'r') as f:
-                ids = [int(x.replace('\n', '')) for x in f.readlines()]
-                print(len(ids), len(set(ids)))
-                ids = sorted(list(set(ids)))
-            logging.info(f'Red {len(ids)} ids')
+        if self.journal is None:
+            self.journal = CrawlJournal(self.get_journal_filepath(filters))
+
+        if self.journal.discovery_finished:
+            ids = self.journal.discovered
+            logging.info(f'Read {len(ids)} ids from {self.journal.filepath}: '
+                         f'{len(self.journal.completed)} completed, {len(self.journal.failed)} failed')
         else:
             ids = await self.collect_ids(filters=filters)
-            with open(filepath, 'w') as f:
-                f.writelines([f'{x}\n' for x in ids])
-            logging.info(f'Wrote {len(ids)} to {filepath}')
-
-        # ids = ids[90000:]  # FIXME
+            self.journal.record_discovered(ids)
+            logging.info(f'Wrote {len(ids)} to {self.journal.filepath}')
         return ids
 
-    async def collect_data(self, ids: list[int]) -> list:
+    @contextmanager
+    def _skip_failed(self, id_: int, failed: list[int]) -> Iterator[None]:
+        # with a journal the id is retried on the next run instead of aborting the crawl
+        try:
+            yield
+        except Exception as ex:
+            if self.journal is None:
+                raise
+            logging.error(f'Failed to collect {id_=}: {ex!r}')
+            failed.append(id_)
+
+    # fetch_one -> parse_one -> flush_batch are the steps of collect_data per id and per batch,
+    # src.pipeline.Pipeline runs them as its stages
+
+    async def fetch_one(self, id_: int, failed: list[int]) -> dict | None:
+        # None if the id failed and was added to `failed`
+        with self._skip_failed(id_, failed):
+            return await self._request_page_info(id_)
+        return None
+
+    def parse_one(self, id_: int, raw: dict, failed: list[int]) -> BaseRow | None:
+        # a payload parse_page_info can't handle, e.g. {"data": null} of a deleted member, fails its id only
+        with self._skip_failed(id_, failed):
+            with PARSE_SECONDS.time(registry=self.registry):
+                return self.parse_page_info(raw)
+        return None
+
+    def flush_batch(self, batch: list[tuple[BaseRow, dict]], failed: list[int]) -> list[BaseRow]:
+        if self.archive is not None and batch:
+            self.archive.append((row.id, raw) for row, raw in batch)
+        if self.store is not None and batch:
+            self.store.upsert(self.registry, batch)
+        if self.journal is not None:
+            if batch:
+                self.journal.record_completed(row.id for row, _ in batch)
+            if failed:
+                self.journal.record_failed(failed)
+                failed.clear()
+        return [row for row, _ in batch]
+
+    async def pending_ids(self, ids: Iterable[int] | AsyncIterable[int], refetch: bool = False) -> AsyncIterator[int]:
+        # `ids` may be an async iterator of a discovery that is still running;
+        # ids already in the store or completed in the journal are skipped
+        stored_ids = self.store.get_ids(self.registry) if self.store is not None and not refetch else ()
+        completed_ids = self.journal.completed if self.journal is not None else ()
+        skipped = 0
+        if isinstance(ids, AsyncIterable):
+            # closing it stops the discovery behind it when the crawl ends early
+            async with aclosing(ids) if hasattr(ids, 'aclose') else nullcontext():
+                async for id_ in ids:
+                    if id_ in stored_ids or id_ in completed_ids:
+                        skipped += 1
+                        continue
+                    yield id_
+        else:
+            for id_ in ids:
+                if id_ in stored_ids or id_ in completed_ids:
+                    skipped += 1
+                    continue
+                yield id_
+        if skipped:
+            logging.info(f'{skipped} ids are in the store or completed in the journal already')
+
+    async def collect_data(
+            self,
+            ids: Iterable[int] | AsyncIterable[int],
+            batch_size: int = 50,
+            refetch: bool = False
+    ) -> AsyncIterator[list[BaseRow]]:
+        # sliding window: `max_concurrency` workers pull ids one by one, so a slow page
+        # holds only its own slot instead of the whole batch
+        ids_iter = self.pending_ids(ids, refetch)
+        ids_lock = asyncio.Lock()
+        # workers wait for a slow consumer instead of piling up rows
+        results = asyncio.Queue(maxsize=batch_size + self.max_concurrency)
+        done = object()
+        failed = []
+
+        async def next_id() -> int | None:
+            async with ids_lock:
+                return await anext(ids_iter, None)
+
+        async def worker():
+            try:
+                while (id_ := await next_id()) is not None:
+                    raw = await self.fetch_one(id_, failed)
+                    row = None if raw is None else self.parse_one(id_, raw, failed)
+                    if row is not None:
+                        await results.put((row, raw))
+            except Exception as ex:
+                await results.put(ex)
+            finally:
+                await results.put(done)
+
+        n_workers = min(self.max_concurrency, len(ids)) if isinstance(ids, Sized) else self.max_concurrency
+        workers = [asyncio.create_task(worker()) for _ in range(n_workers)]
+        active = len(workers)
         tt = 0
-        tasks = []
-        for id_ in ids:
-            tasks.append(self.collect_page_info(id_))
-            if len(tasks) % 50 == 0 or id_ == ids[-1]:
-                res = await asyncio.gather(*tasks)
-                tt += len(res)
+        batch = []
+        try:
+            while active:
+                res = await results.get()
+                if res is done:
+                    active -= 1
+                    continue
+                elif isinstance(res, Exception):
+                    raise res
+
+                batch.append(res)
+                if len(batch) >= batch_size:
+                    tt += len(batch)
+                    self._update_gauges(results.qsize())
+                    ROWS.inc(len(batch), registry=self.registry, stage='collected')
+                    if self.log_throttle('collected'):
+                        logging.info(f'Collected: {tt} pages info | {self.format_limiter_state()}')
+                    yield self.flush_batch(batch, failed)
+                    batch = []
+
+            if batch or failed:
+                tt += len(batch)
+                ROWS.inc(len(batch), registry=self.registry, stage='collected')
                 logging.info(f'Collected: {tt} pages info')
-                tasks = []
-                yield res
+                yield self.flush_batch(batch, failed)
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await ids_iter.aclose()
+
+    def replay_data(self, ids: Iterable[int] | None = None, batch_size: int = 1000) -> Iterator[list[BaseRow]]:
+        # re-parses archived /info responses instead of requesting them, e.g. after a fix
+        # of parse_page_info; the store gets the re-parsed rows
+        assert self.archive is not None, 'replay requires an archive'
+        batch = []
+        failed = []
+        tt = 0
+        for id_, raw in self.archive.iter_raw(ids):
+            # a payload the fixed parser still can't handle fails its id only, as in collect_data
+            row = self.parse_one(id_, raw, failed)
+            if row is not None:
+                batch.append((row, raw))
+            if len(batch) >= batch_size:
+                tt += len(batch)
+                if self.store is not None:
+                    self.store.upsert(self.registry, batch)
+                yield [row for row, _ in batch]
+                batch = []
+
+        if batch:
+            tt += len(batch)
+            if self.store is not None:
+                self.store.upsert(self.registry, batch)
+            yield [row for row, _ in batch]
+        if failed and self.journal is not None:
+            self.journal.record_failed(failed)
+        logging.info(f'Replayed: {tt} pages info from {self.archive.segment_path}, failed: {len(failed)}')
 
     @retry(
-        wait=wait_random(5, 10),
+        retry=retry_if_exception_type(RegistryError),
+        wait=wait_for_error,
+        before_sleep=count_retry,
         # before_sleep=before_sleep_log(logger=logging.getLogger(), log_level=logging.INFO),
         # before=before_log(logger=logging.getLogger(), log_level=logging.INFO),
         # after=after_log(logger=logging.getLogger(), log_level=logging.INFO),
     )
-    async def request_json(self, method: str, url: str, **kwargs):
+    async def request_json(
+            self,
+            method: str,
+            url: str,
+            stream_path: tuple[str, ...] | None = None,
+            on_item: Callable[[Any], bool] | None = None,
+            cache: bool = False,
+            **kwargs
+    ):
+        # with `cache` the response goes through `http_cache`, a fresh entry costs no request;
+        # with `stream_path` the items of that array are passed to `on_item` as they are decoded,
+        # it returns True to stop reading; the result is the response without the array
+        # and the number of items read
         # await asyncio.sleep(random.randint(3, 6))
+        cache_entry = cache_key = None
+        if cache and self.http_cache is not None:
+            cache_key = self.http_cache.key(method, url, kwargs.get('json'))
+            # sqlite and zstd run in a worker thread, not on the event loop of the other requests
+            cache_entry = await asyncio.to_thread(self.http_cache.get, cache_key)
+            if cache_entry is not None:
+                if self.http_cache.is_fresh(cache_entry):
+                    await asyncio.to_thread(self.http_cache.touch, cache_entry)
+                    self.http_cache.record('hit', len(cache_entry.body))
+                    return json.loads(cache_entry.body)
+                kwargs['headers'] = {**kwargs.get('headers', {}), **cache_entry.validators()}
+
+        url_ = URL(url)
+        endpoint = endpoint_of(url_.path)
+        if self.rate_limit:
+            host = url_.host
+            if host not in self._rate_limiters:
+                self._rate_limiters[host] = RateLimiter(self.rate_limit)
+            await self._rate_limiters[host].acquire()
+
+        proxy = self.proxy_pool.choose()
+        error = None
+        async with self.limiter:
+            started_at = time.monotonic()
+            try:
+                data = await self._request(proxy, method, url, endpoint=endpoint,
+                                           stream_path=stream_path, on_item=on_item,
+                                           cache_key=cache_key, cache_entry=cache_entry, **kwargs)
+            except RegistryError as ex:
+                error = ex
+
+        latency = time.monotonic() - started_at
+        REQUEST_SECONDS.observe(latency, registry=self.registry, endpoint=endpoint, proxy=proxy.label,
+                                outcome='ok' if error is None else type(error).__name__)
+        if error is not None:
+            if isinstance(error, (RateLimitedError, ServerError, RequestTimeoutError)):
+                self.limiter.on_overload()
+            await self.proxy_pool.handle_error(proxy, error, self._session)
+            raise error
+
+        self.limiter.on_success(latency)
+        proxy.report_success(latency)
+        return data
+
+    async def _request(
+            self,
+            proxy: Proxy,
+            method: str,
+            url: str,
+            endpoint: str = '',
+            stream_path: tuple[str, ...] | None = None,
+            on_item: Callable[[Any], bool] | None = None,
+            cache_key: str | None = None,
+            cache_entry: CacheEntry | None = None,
+            **kwargs
+    ):
+        # every failure is turned into a RegistryError subclass, so it can be handled by its kind
         try:
-            async with self._session.request(method=method, url=url, timeout=5, **kwargs) as r:
-                return await r.json()
-        except Exception as ex:
-            async with self._session.request(
-                    method='GET',
-                    url='http://node-de-71.astroproxy.com:10509/api/changeIP?apiToken=2de5dfea6b2c1e52'
-            ) as resp:
-                assert resp.ok, resp
-            raise ex
+            async with self._session.request(method=method, url=url, proxy=proxy.url,
+                                             ssl=self.ssl_context, **kwargs) as r:
+                if r.status == 429:
+                    raise RateLimitedError(f'{r.status} {url}')
+                elif r.status >= 500:
+                    raise ServerError(f'{r.status} {url}')
+                elif stream_path is not None:
+                    return await self._read_stream(r, stream_path, on_item, endpoint)
+                elif r.status == 304 and cache_entry is not None:
+                    await asyncio.to_thread(self.http_cache.refresh, cache_entry,
+                                            r.headers.get('ETag'), r.headers.get('Last-Modified'))
+                    self.http_cache.record('revalidated', len(cache_entry.body))
+                    return json.loads(cache_entry.body)
+                body = await r.read()
+                RESPONSE_BYTES.inc(len(body), registry=self.registry, endpoint=endpoint)
+                try:
+                    data = json.loads(body)
+                except ValueError as ex:
+                    raise BadResponseError(f'{r.status} {url}: {ex!r}') from ex
+                # only valid JSON gets cached, not a ban page or an error
+                if cache_key is not None and r.status == 200:
+                    self.http_cache.record(await asyncio.to_thread(
+                        self.http_cache.put, cache_key, body, etag=r.headers.get('ETag'),
+                        last_modified=r.headers.get('Last-Modified'), entry=cache_entry
+                    ))
+                return data
+        except asyncio.TimeoutError as ex:
+            raise RequestTimeoutError(url) from ex
+        except ClientError as ex:
+            raise ConnectionFailedError(f'{proxy}: {ex!r}') from ex
+
+    async def _read_stream(
+            self,
+            r: ClientResponse,
+            stream_path: tuple[str, ...],
+            on_item: Callable[[Any], bool],
+            endpoint: str
+    ) -> tuple[dict, int]:
+        # a response left unread on early exit is not reused, its connection is closed
+        stream = JsonStream(r.content.iter_chunked(self.stream_chunk_size))
+        rest = {}
+        count = 0
+        try:
+            async with aclosing(stream.iter_array(stream_path, rest)) as items:
+                async for item in items:
+                    count += 1
+                    if on_item(item):
+                        break
+        except ValueError as ex:
+            raise BadResponseError(f'{r.status} {r.url}: {ex!r}') from ex
+        finally:
+            RESPONSE_BYTES.inc(stream.bytes_read, registry=self.registry, endpoint=endpoint)
+        return rest, count
+
+    def _update_gauges(self, queue_depth: int) -> None:
+        QUEUE_DEPTH.set(queue_depth, registry=self.registry)
+        CONCURRENCY_LIMIT.set(int(self.limiter.limit), registry=self.registry)
+        IN_FLIGHT.set(self.limiter.in_flight, registry=self.registry)
+
+    def format_limiter_state(self) -> str:
+        state = self.limiter.snapshot()
+        p50, p99 = state['latency_p50'], state['latency_p99']
+        return (f"limit: {state['limit']}, in flight: {state['in_flight']}, errors: {state['errors']}, "
+                f"retries: {self.retries}, "
+                f"p50: {p50 or 0:.2f}s, p99: {p99 or 0:.2f}s")
 
     def get_filename(self, service_name: str) -> str:
         return f'{service_name}_from_{self.date_from.date()}_to_{self.date_to.date()}'
 
     async def __aenter__(self):
-        self._session = await ClientSession().__aenter__()
+        if self._owns_session:
+            self._session = create_session(self.transport)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self._session.close()
+        if self._owns_session:
+            await self._session.close()
+        if self.journal is not None:
+            self.journal.close()
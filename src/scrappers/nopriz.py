@@ -1,81 +1,65 @@
-import logging
-import re
 from datetime import datetime
+from typing import Callable
 
+from src.date_utils import format_iso, parse_iso
 from src.scrappers.base import BaseScrapper
 from src.schemas import NoprizRow
 
 
 class ScraperNopriz(BaseScrapper):
+    registry = 'nopriz'
+    row_model = NoprizRow
+    base_url = 'https://reestr.nopriz.ru'
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
                              '(KHTML, like Gecko) Chrome/102.0.0.0 Safari/537.36'}
 
-    async def _collect_ids(self, filters: dict):
-        ids = set()
-        collect_per_page = 1000
+    async def _request_ids_page(self, filters: dict, page: int, on_item: Callable[[dict], bool]) -> tuple[dict, int]:
         json_ = {
             'filters': filters,
-            'page': 1,
-            'pageCount': f"{collect_per_page}",
+            'page': page,
+            'pageCount': f"{self.ids_page_size}",
             'searchString': "",
             'sortBy': {
                 'registry_registration_date': 'DESC'
             }
         }
-        while True:
-            r_json = await self.request_json(
-                    method='POST',
-                    url='https://reestr.nopriz.ru/api/sro/all/member/list',
-                    headers=self.headers,
-                    proxy=self.proxy_url,
-                    json=json_
-            )
-
-            for d in r_json['data']['data']:
-                dt = datetime.strptime(
-                    re.sub(r'\+0\d:00', '', d['registry_registration_date']),
-                    '%Y-%m-%dT%H:%M:%S'
-                )
-                if dt < self.date_from:
-                    logging.info(f'Page №: {json_["page"]}, last date: {dt}')
-                    logging.info(f'{len(ids)} ids was collected')
-                    return list(ids)
-                elif dt > self.date_to:
-                    continue
-                else:
-                    ids.add(d['id'])
-            else:
-                logging.info(f'Page №: {json_["page"]}, last date: {dt}')
-                logging.info(f'Page №: {json_["page"]} ; Collected ids: {len(ids)}')
+        r_json, count = await self.request_json(
+                method='POST',
+                url=f'{self.base_url}/api/sro/all/member/list',
+                headers=self.headers,
+                json=json_,
+                stream_path=('data', 'data'),
+                on_item=on_item
+        )
+        return r_json['data'], count
 
-            if len(r_json['data']['data']) < collect_per_page:
-                break
-            json_["page"] += 1
-        return list(ids)
+    def _get_registration_date(self, item: dict) -> datetime:
+        return parse_iso(item['registry_registration_date'])
 
-    async def collect_page_info(self, id_: int) -> NoprizRow:
+    async def _request_page_info(self, id_: int) -> dict:
         r = await self.request_json(
             method='POST',
-            url=f'https://reestr.nopriz.ru/api/member/{id_}/info',
+            url=f'{self.base_url}/api/member/{id_}/info',
             headers=self.headers,
-            proxy=self.proxy_url
+            cache=True
         )
-        r = r['data']
+        return r['data']
 
-        return NoprizRow(
+    def parse_page_info(self, r: dict) -> NoprizRow:
+        return NoprizRow.construct_trusted(
             id=r['id'],
             sro=r['sro'].get('full_description'),
             registration_number=r['registration_number'],
             full_description=r.get('full_description'),
             short_description=r.get('short_description'),
             member_type=r['member_type'].get('title') if r.get('member_type') else None,
-            registry_registration_date=datetime.strptime(
-                r['registry_registration_date'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format}') if r.get('registry_registration_date') else None,
+            registry_registration_date=format_iso(
+                r['registry_registration_date'], self.date_format
+            ) if r.get('registry_registration_date') else None,
             basis=r.get('basis'),
-            approved_basis_date=datetime.strptime(
-                r['approved_basis_date'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format}') if r.get('approved_basis_date') else None,
+            approved_basis_date=format_iso(
+                r['approved_basis_date'], self.date_format
+            ) if r.get('approved_basis_date') else None,
             ogrnip=r.get('ogrnip'),
             inn=r.get('inn'),
             phones=r.get('phones'),
@@ -83,15 +67,15 @@ class ScraperNopriz(BaseScrapper):
             director=r.get('director'),
             member_status=r['member_status'].get('title') if r.get('member_status') else None,
             accordance_status=r['accordance_status'].get('title') if r.get('accordance_status') else None,
-            created_at=datetime.strptime(
-                r['created_at'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format}') if r.get('created_at') else None,
-            last_updated_at=datetime.strptime(
-                r['last_updated_at'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format} %X') if r.get('last_updated_at') else None,
-            suspension_date=datetime.strptime(
-                r['suspension_date'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format} %X') if r.get('suspension_date') else None,
+            created_at=format_iso(
+                r['created_at'], self.date_format
+            ) if r.get('created_at') else None,
+            last_updated_at=format_iso(
+                r['last_updated_at'], self.datetime_format
+            ) if r.get('last_updated_at') else None,
+            suspension_date=format_iso(
+                r['suspension_date'], self.datetime_format
+            ) if r.get('suspension_date') else None,
             suspension_reason=r.get('suspension_reason'),
             member_right_vv=r['member_right_vv'].get('compensation_fund') if r.get('member_right_vv') else None,
             member_right_odo=r['member_right_odo'].get('compensation_fund') if r.get('member_right_odo') else None
@@ -1,63 +1,56 @@
 from datetime import datetime
-import logging
-import ssl
+from typing import Callable
 
+from src.date_utils import format_iso, parse_datetime
+from src.exceptions import BadResponseError
 from src.scrappers.base import BaseScrapper
 from src.schemas import NostroyRow
+from src.transport import SSL_CONTEXT
 
 from config import FILEPATH_CERT
 
-ssl_context = ssl.create_default_context(capath=FILEPATH_CERT)
+REGISTRATION_DATE_FORMAT = '%d.%m.%Y %H:%M:%S'
 
 
 class ScraperNostroy(BaseScrapper):
-    async def _collect_ids(self, filters: dict) -> list[int]:
-        ids = set()
+    registry = 'nostroy'
+    row_model = NostroyRow
+    base_url = 'https://reestr.nostroy.ru'
+    # reestr.nostroy.ru doesn't send its intermediate certificate, it is verified only with the one from secrets
+    ssl_context = SSL_CONTEXT if FILEPATH_CERT.exists() else False
+
+    async def _request_ids_page(self, filters: dict, page: int, on_item: Callable[[dict], bool]) -> tuple[dict, int]:
         data = {
             'filters': filters,
-            'page': 1,
-            'pageCount': 1000,
+            'page': page,
+            'pageCount': self.ids_page_size,
             "sortBy": {
                 'registry_registration_date': "DESC"  # sorted from new to old registrations
             }
         }
+        url = f'{self.base_url}/api/sro/all/member/list'
+        r_json, count = await self.request_json(method='POST', url=url, json=data,
+                                                stream_path=('data', 'data'), on_item=on_item)
 
-        while True:
-            url = 'https://reestr.nostroy.ru/api/sro/all/member/list'
-            r_json = await self.request_json(method='POST', url=url, json=data, proxy=self.proxy_url, verify_ssl=False)
-
-            assert r_json['success'] is True, r_json['message']
-
-            if r_json['data']['count'] == 0:
-                return list(ids)
-
-            for d in r_json['data']['data']:
-                dt = datetime.strptime(d['registry_registration_date_time_string'], '%d.%m.%Y %H:%M:%S')
-                if dt < self.date_from:
-                    logging.info(f'{len(ids)} ids collected until {self.date_from}')
-                    return list(ids)
-                elif dt > self.date_to:
-                    continue
-                else:
-                    ids.add(d['id'])
-            else:
-                logging.info(f"last date page {data['page']}: {dt}")
-                data['page'] += 1
+        # the read stops at the first item older than `date_from`, keys after `data` may be missing
+        if r_json.get('success') is False:
+            raise BadResponseError(f"{url}: {r_json.get('message')}")
+        return r_json['data'], count
 
-            logging.info(f'{len(ids)} ids collected')
-            if len(r_json['data']['data']) < data['pageCount'] or data['page'] > r_json['data']['countPages']:
-                return list(ids)
+    def _get_registration_date(self, item: dict) -> datetime:
+        return parse_datetime(item['registry_registration_date_time_string'], REGISTRATION_DATE_FORMAT)
 
-    async def collect_page_info(self, id_: str) -> NostroyRow:
-        url = f'https://reestr.nostroy.ru/api/member/{id_}/info'
-        r = await self.request_json(method='POST', url=url, verify_ssl=False, proxy=self.proxy_url)
-        r = r['data']
+    async def _request_page_info(self, id_: int) -> dict:
+        url = f'{self.base_url}/api/member/{id_}/info'
+        r = await self.request_json(method='POST', url=url, cache=True)
+        return r['data']
 
+    def parse_page_info(self, r: dict) -> NostroyRow:
         is_odo = None
         if r.get('right') and r['right']['is_odo']:
             is_odo = 'Действует без ограничений, в пределах фактического совокупного размера обязательств'
 
-        return NostroyRow(
+        return NostroyRow.construct_trusted(
             id=r['id'],
             sro=r['sro'].get('full_description'),
             full_description=r.get('full_description'),
@@ -71,12 +64,12 @@ class ScraperNostroy(BaseScrapper):
             director=r.get('director'),
             accordance_status=r['accordance_status'].get('title') if r.get('accordance_status') else None,
             member_type=r['member_type'].get('title') if r.get('member_type') else None,
-            registry_registration_date=datetime.strptime(
-                r['registry_registration_date'], '%Y-%m-%dT%X%z'
-            ).strftime(self.date_format) if r.get('registry_registration_date') else None,
-            last_updated_at=datetime.strptime(
-                r['last_updated_at'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format} %X') if r.get('last_updated_at') else None,
+            registry_registration_date=format_iso(
+                r['registry_registration_date'], self.date_format
+            ) if r.get('registry_registration_date') else None,
+            last_updated_at=format_iso(
+                r['last_updated_at'], self.datetime_format
+            ) if r.get('last_updated_at') else None,
             right_status=r['right']['right_status']['title'] if r.get('right') else None,
             right_basis=r['right']['basis'] if r.get('right') else None,
             is_simple=r['right']['is_simple'] if r.get('right') else None,
@@ -89,7 +82,7 @@ class ScraperNostroy(BaseScrapper):
                                     f"{r['responsibility_level_vv']['cost']}" if r.get('responsibility_level_vv') else None,
             compensation_fund_fee_vv=r.get('compensation_fund_fee_vv'),
             compensation_fund_fee_odo=r.get('compensation_fund_fee_odo'),
-            compensation_fund_fee_odopayment_date=datetime.strptime(
-                r['right']['compensation_fund_fee_odopayment_date'], '%Y-%m-%dT%X%z'
-            ).strftime(f'{self.date_format} %X') if r.get('right') else None,
+            compensation_fund_fee_odopayment_date=format_iso(
+                r['right']['compensation_fund_fee_odopayment_date'], self.datetime_format
+            ) if r.get('right') else None,
         )
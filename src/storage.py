@@ -0,0 +1,140 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Self, Type
+
+from config import FILEPATH_DB
+from src.date_utils import to_iso
+from src.id_set import IdSet
+from src.schemas import BaseRow
+
+
+def hash_raw(raw: dict) -> str:
+    return hashlib.blake2b(
+        json.dumps(raw, sort_keys=True, ensure_ascii=False).encode(),
+        digest_size=16
+    ).hexdigest()
+
+
+class MemberStore:
+    chunk_size: int = 900  # stays below SQLITE_MAX_VARIABLE_NUMBER of old sqlite builds
+
+    def __init__(self, filepath: Path | str = FILEPATH_DB):
+        self.filepath = filepath
+        self.conn = sqlite3.connect(filepath)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA busy_timeout=30000')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS members (
+                registry TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                raw_hash TEXT NOT NULL,
+                updated_at TEXT,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (registry, id)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS state (
+                registry TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                PRIMARY KEY (registry, key)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_state(self, registry: str, key: str) -> str | None:
+        row = self.conn.execute('SELECT value FROM state WHERE registry = ? AND key = ?', (registry, key)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, registry: str, key: str, value: str | None) -> None:
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO state (registry, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (registry, key) DO UPDATE SET value = excluded.value',
+                (registry, key, value)
+            )
+
+    def upsert(self, registry: str, records: Iterable[tuple[BaseRow, dict]]) -> None:
+        fetched_at = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                '''
+                INSERT INTO members (registry, id, data, raw_hash, updated_at, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (registry, id) DO UPDATE SET
+                    data = excluded.data,
+                    raw_hash = excluded.raw_hash,
+                    updated_at = excluded.updated_at,
+                    fetched_at = excluded.fetched_at
+                ''',
+                [
+                    (
+                        registry,
+                        row.id,
+                        json.dumps(row.model_dump(), ensure_ascii=False),
+                        hash_raw(raw),
+                        to_iso(raw.get('last_updated_at')),
+                        fetched_at
+                    )
+                    for row, raw in records
+                ]
+            )
+
+    def get_ids(self, registry: str) -> IdSet:
+        cursor = self.conn.execute('SELECT id FROM members WHERE registry = ?', (registry,))
+        return IdSet(id_ for id_, in cursor)
+
+    def get_updated_at(self, registry: str) -> dict[int, str | None]:
+        cursor = self.conn.execute('SELECT id, updated_at FROM members WHERE registry = ?', (registry,))
+        return dict(cursor.fetchall())
+
+    def iter_data(self, registry: str) -> Iterator[dict]:
+        # field values of the rows by field name, ordered by id, without building the models
+        cursor = self.conn.execute('SELECT data FROM members WHERE registry = ? ORDER BY id', (registry,))
+        for data, in cursor:
+            yield json.loads(data)
+
+    def iter_rows(
+            self,
+            registry: str,
+            row_model: Type[BaseRow],
+            ids: Iterable[int] | None = None
+    ) -> Iterator[BaseRow]:
+        # rows were validated before they got into the store
+        if ids is None:
+            cursor = self.conn.execute('SELECT data FROM members WHERE registry = ? ORDER BY id', (registry,))
+            for data, in cursor:
+                yield row_model.model_construct(**json.loads(data))
+            return
+
+        ids = sorted(ids)
+        for i in range(0, len(ids), self.chunk_size):
+            chunk = ids[i:i + self.chunk_size]
+            cursor = self.conn.execute(
+                f'SELECT data FROM members WHERE registry = ? AND id IN ({",".join("?" * len(chunk))}) ORDER BY id',
+                (registry, *chunk)
+            )
+            for data, in cursor:
+                yield row_model.model_construct(**json.loads(data))
+
+    def get_rows(
+            self,
+            registry: str,
+            row_model: Type[BaseRow],
+            ids: Iterable[int] | None = None
+    ) -> list[BaseRow]:
+        return list(self.iter_rows(registry, row_model, ids))
@@ -0,0 +1,47 @@
+import ssl
+from pathlib import Path
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from pydantic import BaseModel
+
+from config import FILEPATH_CERT
+
+
+class TransportConfig(BaseModel):
+    limit: int = 200
+    limit_per_host: int = 50
+    ttl_dns_cache: int = 600
+    keepalive_timeout: float = 60
+    timeout_total: float = 30
+    timeout_connect: float = 5
+    timeout_sock_read: float = 15
+
+
+def create_ssl_context(cafile: Path = FILEPATH_CERT) -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    if cafile.exists():
+        context.load_verify_locations(cafile=cafile)
+    return context
+
+
+# building a context loads the system CA store, so it is done once per process
+SSL_CONTEXT = create_ssl_context()
+
+
+def create_session(config: TransportConfig | None = None, **kwargs) -> ClientSession:
+    # must be called inside a running event loop; one session may be shared by several scrapers
+    config = config or TransportConfig()
+    connector = TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.ttl_dns_cache,
+        keepalive_timeout=config.keepalive_timeout,
+        ssl=SSL_CONTEXT,
+        enable_cleanup_closed=True,
+    )
+    timeout = ClientTimeout(
+        total=config.timeout_total,
+        connect=config.timeout_connect,
+        sock_read=config.timeout_sock_read,
+    )
+    return ClientSession(connector=connector, timeout=timeout, **kwargs)